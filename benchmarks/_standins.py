@@ -0,0 +1,123 @@
+"""Stand-in models and helpers shared by the benchmarks, so they run without Ollama.
+
+StandInLLM answers every analysis and summary prompt with a fixed, well-formed reply after a delay proportional
+to prompt length, one request at a time like a single Ollama slot. PrefillChatModel waits in proportion to the
+estimated prompt tokens before its first token, like prefill without a prompt cache. Call counts and prompt
+sizes are exact, timings indicative.
+
+Import this after putting the Binaries dir on sys.path and changing to the benchmark's temporary directory.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+import main
+
+SECONDS_PER_PROMPT_CHAR = 0.00002  # ~20 ms per 1k prompt characters
+SECONDS_PER_CALL = 0.01
+
+QUESTION = "Work was stressful again today and I could not focus, but talking to my friend helped a bit."
+REPLY_SENTENCES = ("It sounds like a demanding day, and it is good that you reached out to your friend. "
+                   "Short breaks and a consistent sleep routine can make focusing easier. ")
+REPLY = REPLY_SENTENCES * 3
+NOTES = "- stressed at work, trouble focusing\n- talking to a friend helped"
+DAILY_SUMMARY = ("### Summary\nStressed by work but supported by a friend.\n\n"
+                 "### Tips\n- Take short breaks\n- Keep a sleep routine\n- Reach out to friends")
+SESSION_SUMMARY = ("The user has been stressed by work and struggles to focus; talking to a friend helps. "
+                   "Mindwell suggested short breaks, evening walks and a regular sleep routine. ") * 4
+MESSAGE_ANALYSIS = '{"mood": 0, "memory": "none", "title": "", "fact": {"valid": false, "type": "", "value": ""}}'
+
+# Analysis model calls and prompt sizes since the last reset_stats(), and the prompt tokens of each chat reply
+stats = {"calls": 0, "prompt_chars": 0, "max_prompt_tokens": 0, "chat_prompt_tokens": []}
+model_slot = threading.Lock()
+moods = []  # moods logged through log_mood_in_memory
+
+
+def reset_stats():
+    stats.update(calls=0, prompt_chars=0, max_prompt_tokens=0, chat_prompt_tokens=[])
+
+
+class StandInLLM(LLM):
+    """Answers the analysis, notes and summary prompts with fixed, well-formed replies."""
+
+    @property
+    def _llm_type(self):
+        return "stand-in"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        stats["calls"] += 1
+        stats["prompt_chars"] += len(prompt)
+        stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], main.estimate_tokens(prompt))
+        with model_slot:
+            time.sleep(SECONDS_PER_CALL + SECONDS_PER_PROMPT_CHAR * len(prompt))
+        if "numbered user messages" in prompt:
+            ids = re.findall(r"^(\d+)\. ", prompt.split("User messages:", 1)[1], re.MULTILINE)
+            results = [{"id": int(i), "mood": 0, "memory": "none", "title": "", "fact": {"valid": False}} for i in ids]
+            return json.dumps({"results": results})
+        if "JSON object" in prompt:
+            return MESSAGE_ANALYSIS
+        if "emotional tone" in prompt:
+            return "0"
+        if "special positive memory" in prompt:
+            return "no"
+        if "brief notes" in prompt:
+            return NOTES
+        if "updated summary" in prompt:
+            return SESSION_SUMMARY
+        if "### Summary" in prompt:
+            return DAILY_SUMMARY
+        return "validity: false\ntype: none\nvalue: none"
+
+
+class PrefillChatModel(BaseChatModel):
+    """Waits for a simulated prefill of the whole prompt, then streams a short reply."""
+
+    seconds_per_token: float = 0.0005  # ~2k tokens/s prefill
+
+    @property
+    def _llm_type(self):
+        return "prefill-stand-in"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = sum(main.estimate_tokens(message.content) for message in messages)
+        stats["chat_prompt_tokens"].append(tokens)
+        await asyncio.sleep(tokens * self.seconds_per_token)
+        for word in ("Take", " a", " short", " walk."):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def use_analysis_standin(model_name=None):
+    """Replaces every cached analysis model (plain and schema-constrained) with one StandInLLM."""
+    model_name = model_name or main.ANALYSIS_MODEL
+    standin = StandInLLM()
+    for key in (f"{model_name}_False", f"{model_name}_False_message_analysis", f"{model_name}_False_batch_analysis"):
+        main._model_instances[key] = standin
+    return standin
+
+
+async def log_mood_in_memory(mood):
+    moods.append(mood)
+
+
+async def no_memories(question):
+    return []
+
+
+def send(client, session_id, model_name):
+    """Sends QUESTION through /stream in session_id; returns seconds until the first token."""
+    payload = {"question": QUESTION, "model": model_name, "language": "en", "session_id": session_id}
+    start = time.perf_counter()
+    with client.stream("POST", "/stream", json=payload) as response:
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                return time.perf_counter() - start
@@ -0,0 +1,78 @@
+"""Analysis cost of replaying a conversation buffer, e.g. /process_conversations retried after a failure:
+first pass vs replay with the analysis cache, for each analysis mode, plus a buffer of repeated greetings.
+
+By default the cached analysis models are replaced with a stand-in that sleeps in proportion to prompt length,
+one request at a time like a single Ollama slot, so LLM call counts are exact and timings are indicative.
+Mood logging is kept in memory. Pass --live to use the real Ollama models instead.
+
+Usage: python benchmarks/bench_analysis_cache.py [--messages 200] [--live]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+import main  # noqa: E402
+import memory  # noqa: E402
+from _standins import log_mood_in_memory, reset_stats, stats, use_analysis_standin  # noqa: E402
+
+main.init_db()
+
+MESSAGES = [
+    "I finally got the job offer I have been working towards all year!",
+    "Feeling a bit down today, the rain is not helping.",
+    "My sister and I went hiking and watched the sunrise together.",
+    "I want to start running three times a week.",
+    "Nothing special, just had lunch.",
+]
+GREETINGS = ["hi", "Hi", "hello", "hi ", "thanks", "good morning"]
+
+
+async def run(messages, mode):
+    main.COMBINED_ANALYSIS = mode != "separate"
+    reset_stats()
+    main.analysis_cache_stats.update(hits=0, misses=0)
+    start = time.perf_counter()
+    if mode == "batched":
+        await main.analyze_buffered_messages(messages, "en")
+    else:
+        await asyncio.gather(*(main.process_message(message, "en") for message in messages))
+    lookups = main.analysis_cache_stats["hits"] + main.analysis_cache_stats["misses"]
+    hit_rate = main.analysis_cache_stats["hits"] / lookups if lookups else 0
+    return time.perf_counter() - start, stats["calls"], hit_rate
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--live", action="store_true", help="use the real Ollama models")
+    args = parser.parse_args()
+
+    main.log_mood = log_mood_in_memory
+    if not args.live:
+        use_analysis_standin()
+
+    buffers = {
+        "distinct": [f"{MESSAGES[i % len(MESSAGES)]} ({i})" for i in range(args.messages)],
+        "greetings": [GREETINGS[i % len(GREETINGS)] for i in range(args.messages)],
+    }
+
+    print(f"{'live Ollama' if args.live else 'stand-in model'}, {args.messages} messages per buffer\n")
+    print(f"{'buffer':<10} {'mode':<10} {'pass':<7} {'LLM calls':>10} {'hit rate':>9} {'wall (s)':>9}")
+    for name, messages in buffers.items():
+        for mode in ("separate", "combined", "batched"):
+            memory.clear_analysis_cache()
+            for run_name in ("first", "replay"):
+                wall, calls, hit_rate = asyncio.run(run(messages, mode))
+                calls_text = f"{calls}" if not args.live else "n/a"
+                print(f"{name:<10} {mode:<10} {run_name:<7} {calls_text:>10} {hit_rate:>9.0%} {wall:>9.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,101 @@
+"""Conversation-buffer add latency over one long session: the old scheme that rewrote a per-sender row with
+every message appended vs one inserted row per message.
+
+Each turn adds the user message and the assistant reply, like /stream does after a reply finishes.
+
+Usage: python benchmarks/bench_buffer_append.py [--turns 500] [--reply-chars 600]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+
+# init_db() creates memory.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+import memory  # noqa: E402
+from db import get_connection, transaction  # noqa: E402
+
+memory.init_db()
+
+LEGACY_DB = "legacy_buffer.db"
+
+
+def legacy_add_to_buffer(sender, message):
+    """The previous add_to_buffer: read the sender's unread row and rewrite it with the message appended."""
+    timestamp = datetime.now().isoformat()
+    with transaction(LEGACY_DB) as conn:
+        existing = conn.execute(
+            "SELECT id, message FROM conversation_buffer WHERE sender = ? AND status = 'unread' ORDER BY timestamp DESC LIMIT 1",
+            (sender,)
+        ).fetchone()
+        if existing:
+            conn.execute(
+                "UPDATE conversation_buffer SET message = ?, timestamp = ? WHERE id = ?",
+                (f"{existing[1]}\n---\n{message}", timestamp, existing[0])
+            )
+        else:
+            conn.execute(
+                "INSERT INTO conversation_buffer (timestamp, sender, message, status) VALUES (?, ?, ?, 'unread')",
+                (timestamp, sender, message)
+            )
+
+
+def legacy_add_turn(question, reply):
+    legacy_add_to_buffer("user", question)
+    legacy_add_to_buffer("assistant", reply)
+
+
+def init_legacy_db():
+    conn = get_connection(LEGACY_DB)
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_buffer (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                sender TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'unread'
+            )
+        """)
+
+
+def run(add_turn, turns, reply_chars):
+    latencies = []
+    for turn in range(turns):
+        question = f"Turn {turn}: how should I handle feeling tired after work?"
+        reply = ("Try a short walk and an earlier bedtime. " * (reply_chars // 41 + 1))[:reply_chars]
+        start = time.perf_counter()
+        add_turn(question, reply)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--reply-chars", type=int, default=600)
+    args = parser.parse_args()
+
+    init_legacy_db()
+    results = {
+        "rewrite row": run(legacy_add_turn, args.turns, args.reply_chars),
+        "insert rows": run(lambda q, r: memory.add_turn_to_buffer(q, r, "bench"), args.turns, args.reply_chars),
+    }
+
+    tail = max(1, args.turns // 10)
+    print(f"{args.turns}-turn session, {args.reply_chars}-char replies, per-turn add latency\n")
+    print(f"{'scheme':<12} {'first 10% (ms)':>15} {'last 10% (ms)':>14} {'p50 (ms)':>9} {'total (s)':>10}")
+    for name, latencies in results.items():
+        print(f"{name:<12} {statistics.mean(latencies[:tail]):>15.3f} {statistics.mean(latencies[-tail:]):>14.3f} "
+              f"{statistics.median(latencies):>9.3f} {sum(latencies) / 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Chat time-to-first-token against session length: sending every stored turn with each message vs the
+token-budgeted context (summary, recent turns and top memories within CHAT_CONTEXT_TOKENS).
+
+/stream runs in-process with the chat model replaced by a stand-in that waits in proportion to the estimated
+prompt tokens before its first token, like prefill without a prompt cache, so TTFT follows prompt size.
+Each session is seeded with the given number of turns, then a few messages are sent and the medians reported.
+
+Usage: python benchmarks/bench_chat_context.py [--turns 10 100 300] [--messages 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+import memory  # noqa: E402
+from _standins import QUESTION, REPLY, PrefillChatModel, no_memories, send, stats  # noqa: E402
+
+main.init_db()
+
+MODEL_NAME = "bench-chat"
+
+
+def seed_session(session_id, turns):
+    for turn in range(turns):
+        memory.add_turn_to_buffer(f"{QUESTION} ({turn})", REPLY, session_id)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--messages", type=int, default=3)
+    args = parser.parse_args()
+
+    chat_model = PrefillChatModel()
+    main._model_instances[f"{MODEL_NAME}_True_chat"] = chat_model
+    main.retrieve_special_memories = no_memories
+    budget, max_turns = main.CHAT_CONTEXT_TOKENS, main.CHAT_HISTORY_MAX_TURNS
+    client = TestClient(main.app)
+
+    print(f"stand-in prefill {chat_model.seconds_per_token * 1e6:.0f} us/token, budget {budget} tokens\n")
+    print(f"{'turns':>6} {'context':<10} {'prompt (tok)':>13} {'TTFT p50 (ms)':>14}")
+    for turns in args.turns:
+        for name, limits in (("all turns", (10 ** 9, 10 ** 9)), ("budgeted", (budget, max_turns))):
+            main.CHAT_CONTEXT_TOKENS, main.CHAT_HISTORY_MAX_TURNS = limits
+            session_id = f"{name}-{turns}"
+            seed_session(session_id, turns)
+            stats["chat_prompt_tokens"].clear()
+            ttfts = [send(client, session_id, MODEL_NAME) for _ in range(args.messages)]
+            print(f"{turns:>6} {name:<10} {statistics.median(stats['chat_prompt_tokens']):>13.0f} {statistics.median(ttfts) * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,77 @@
+"""Daily summary latency against conversation length: one prompt holding the whole conversation (the previous
+behaviour) vs incremental map-reduce summarization of only new messages, plus a re-run with nothing new.
+
+By default the analysis model is replaced with a stand-in that sleeps in proportion to prompt length, one
+request at a time like a single Ollama slot, so call counts and prompt sizes are exact and timings are
+indicative. "max prompt" is worth comparing with the model's context window (Ollama's num_ctx), beyond which
+the conversation is silently truncated. Pass --live to use the real Ollama model instead.
+
+Usage: python benchmarks/bench_daily_summary.py [--turns 10 100 500] [--live]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+import main  # noqa: E402
+import memory  # noqa: E402
+from _standins import QUESTION, REPLY_SENTENCES, reset_stats, stats, use_analysis_standin  # noqa: E402
+from db import transaction  # noqa: E402
+
+memory.init_db()
+
+REPLY = REPLY_SENTENCES * 4
+
+
+def seed_buffer(turns):
+    with transaction(memory.MEMORY_DB) as conn:
+        conn.execute("DELETE FROM conversation_buffer")
+        conn.execute("DELETE FROM daily_summaries")
+    for turn in range(turns):
+        memory.add_turn_to_buffer(f"{QUESTION} ({turn})", REPLY, "bench")
+    return memory.get_unread_buffer()
+
+
+async def timed_summary(conversations):
+    reset_stats()
+    start = time.perf_counter()
+    await main.today_generate(conversations, "en")
+    return time.perf_counter() - start, stats["calls"], stats["max_prompt_tokens"]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--live", action="store_true", help="use the real Ollama model")
+    args = parser.parse_args()
+
+    if not args.live:
+        use_analysis_standin()
+    chunk_tokens = main.SUMMARY_CHUNK_TOKENS
+
+    print(f"{'live Ollama' if args.live else 'stand-in model'}, chunk budget {chunk_tokens} tokens\n")
+    print(f"{'turns':>6} {'mode':<14} {'LLM calls':>10} {'max prompt (tok)':>17} {'wall (s)':>9}")
+    for turns in args.turns:
+        conversations = seed_buffer(turns)
+        main.SUMMARY_CHUNK_TOKENS = 10 ** 9
+        rows = [("whole prompt", *asyncio.run(timed_summary(conversations)))]
+
+        seed_buffer(0)  # drop the summary so the incremental run starts from scratch
+        main.SUMMARY_CHUNK_TOKENS = chunk_tokens
+        rows.append(("incremental", *asyncio.run(timed_summary(conversations))))
+        rows.append(("nothing new", *asyncio.run(timed_summary(conversations))))
+
+        for mode, wall, calls, max_prompt in rows:
+            calls_text = f"{calls}" if not args.live else "n/a"
+            prompt_text = f"{max_prompt}" if not args.live else "n/a"
+            print(f"{turns:>6} {mode:<14} {calls_text:>10} {prompt_text:>17} {wall:>9.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,102 @@
+"""Per-call latency of memory.py helpers: fresh connection per call vs pooled connections.
+
+Usage: python benchmarks/bench_db_connections.py [iterations]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+
+# init_db() creates memory.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+import memory  # noqa: E402
+from db import close_all_connections  # noqa: E402
+
+memory.init_db()
+
+
+def seed(n=500):
+    for i in range(n):
+        memory.add_special_memory(f"memory {i} about my dog walk in the park number {i}", f"Title {i}")
+    memory.upsert_today_summary("2025-01-01", "summary", "tips")
+
+
+# --- Legacy per-call connection versions (what memory.py did before pooling) ---
+def legacy_get_today_summary(date):
+    conn = sqlite3.connect(memory.MEMORY_DB)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("SELECT summary, tips FROM daily_summaries WHERE date = ?", (date,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def legacy_get_relevant(query, k=20):
+    conn = sqlite3.connect(memory.MEMORY_DB)
+    conn.row_factory = sqlite3.Row
+    words = query.lower().split()
+    sql = f"SELECT memory, timestamp FROM special_memories WHERE {' OR '.join('memory LIKE ?' for _ in words)}"
+    rows = conn.execute(sql, [f"%{w}%" for w in words]).fetchall()
+    conn.close()
+    word_set = set(words)
+    scored = [(len(word_set & set(row["memory"].lower().split())), dict(row)) for row in rows]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [row for score, row in scored[:k] if score > 0]
+
+
+def legacy_add_to_buffer(sender, message):
+    conn = sqlite3.connect(memory.MEMORY_DB)
+    try:
+        existing = conn.execute(
+            "SELECT id, message FROM conversation_buffer WHERE sender = ? AND status = 'unread' ORDER BY timestamp DESC LIMIT 1",
+            (sender,),
+        ).fetchone()
+        if existing:
+            conn.execute("UPDATE conversation_buffer SET message = ? WHERE id = ?", (f"{existing[1]}\n---\n{message}", existing[0]))
+        else:
+            conn.execute("INSERT INTO conversation_buffer (sender, message, status) VALUES (?, ?, 'unread')", (sender, message))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def timeit(label, fn, iterations):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / iterations * 1e6
+    print(f"{label:<50} {per_call_us:10.1f} us/call")
+    return per_call_us
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seed()
+
+    cases = [
+        ("get_today_summary", lambda: legacy_get_today_summary("2025-01-01"), lambda: memory.get_today_summary("2025-01-01")),
+        ("get_relevant_special_memories", lambda: legacy_get_relevant("my dog park"), lambda: memory.get_relevant_special_memories("my dog park")),
+        ("add_turn_to_buffer",
+         lambda: (legacy_add_to_buffer("user", "hello"), legacy_add_to_buffer("assistant", "hello")),
+         lambda: memory.add_turn_to_buffer("hello", "hello")),
+    ]
+
+    print(f"{iterations} iterations, database: {os.path.abspath(memory.MEMORY_DB)}\n")
+    for name, legacy, pooled in cases:
+        before = timeit(f"{name} (per-call connect)", legacy, iterations)
+        after = timeit(f"{name} (pooled)", pooled, iterations)
+        print(f"{'':<50} {before / after:10.1f}x faster\n")
+
+    close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Peak Python memory and time of /export_data: the previous fetchall + pandas + StringIO/BytesIO export vs the
+streaming exporters, at growing conversation-buffer sizes. The streaming CSV is also checked against the pandas
+CSV of the same tables, and the script exits non-zero if they differ.
+
+The previous export needs pandas, which the backend no longer depends on; it is skipped when pandas is missing.
+
+Usage: python benchmarks/bench_export.py [--rows 10000 100000]
+"""
+import argparse
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+
+# init_db() creates memory.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+import main  # noqa: E402
+import memory  # noqa: E402
+from db import transaction  # noqa: E402
+
+memory.init_db()
+
+MESSAGE = "I had a long day at work but the evening walk with my dog helped me relax. " * 4
+
+
+def legacy_csv(tables=("special_memories", "conversation_buffer", "daily_summaries")):
+    """The previous export_data body: whole tables through pandas into one in-memory CSV."""
+    import pandas as pd
+
+    conn = sqlite3.connect(memory.MEMORY_DB)
+    cursor = conn.cursor()
+    all_data = io.StringIO()
+    for table_name in tables:
+        cursor.execute(f"SELECT * FROM {table_name}")
+        rows = cursor.fetchall()
+        column_names = [description[0] for description in cursor.description]
+        if rows:
+            all_data.write(f"Table: {table_name}\n")
+            pd.DataFrame(rows, columns=column_names).to_csv(all_data, index=False)
+            all_data.write("\n\n")
+    conn.close()
+    body = io.BytesIO(all_data.getvalue().encode("utf-8"))
+    return body.getvalue()
+
+
+def legacy_export():
+    return len(legacy_csv())
+
+
+def csv_matches_pandas():
+    """Whether the streaming CSV equals the pandas CSV of every exported table, byte for byte."""
+    return b"".join(main.export_csv()) == legacy_csv(memory.EXPORT_TABLES)
+
+
+def consume(exporter):
+    return sum(len(chunk) for chunk in exporter())
+
+
+def seed(rows):
+    with transaction(memory.MEMORY_DB) as conn:
+        conn.execute("DELETE FROM conversation_buffer")
+        conn.execute("DELETE FROM mood_log")
+        conn.executemany(
+            "INSERT INTO conversation_buffer (timestamp, sender, message, status, session_id, turn) VALUES (?, ?, ?, 'processed', 'bench', ?)",
+            [("2026-01-01T12:00:00", "user" if i % 2 == 0 else "assistant", f"{MESSAGE}{i}", i // 2) for i in range(rows)]
+        )
+        conn.executemany(
+            "INSERT INTO mood_log (mood, timestamp) VALUES (?, ?)",
+            [(i % 5, f"2026-01-01T{i % 24:02d}:00:00") for i in range(rows // 10)]
+        )
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    cases = [
+        ("streaming csv", lambda: consume(main.export_csv)),
+        ("streaming ndjson", lambda: consume(main.export_ndjson)),
+        ("streaming zip", lambda: consume(main.export_zip)),
+    ]
+    try:
+        import pandas  # noqa: F401
+        cases.insert(0, ("pandas csv", legacy_export))
+        check = True
+    except ImportError:
+        print("pandas not installed, skipping the previous export\n")
+        check = False
+
+    print(f"{'rows':>8} {'export':<18} {'output (MB)':>12} {'peak memory (MB)':>17} {'time (s)':>9}")
+    for rows in args.rows:
+        seed(rows)
+        for name, fn in cases:
+            size, elapsed, peak = measure(fn)
+            print(f"{rows:>8} {name:<18} {size / 1e6:>12.1f} {peak / 1e6:>17.1f} {elapsed:>9.2f}")
+        if check and not csv_matches_pandas():
+            print(f"streaming csv differs from the pandas csv at {rows} rows")
+            sys.exit(1)
+    if check:
+        print("\nstreaming csv matches the pandas csv")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,83 @@
+"""Chat time-to-first-token while a background analysis backlog is running, with and without the LLM scheduler.
+
+A stand-in Ollama server processes at most --ollama-parallel requests at once and queues the rest FIFO, like
+OLLAMA_NUM_PARALLEL. "unscheduled" lets every background job through at once (the old asyncio.gather
+behaviour); "scheduled" uses the real scheduler limits from llm_scheduler.py.
+
+Usage: python benchmarks/bench_llm_scheduler.py [--backlog 200] [--chats 10]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+
+import llm_scheduler  # noqa: E402
+
+MODEL = "gemma3n:e2b"
+
+
+class StandInOllama:
+    """FIFO server with a fixed number of parallel slots."""
+
+    def __init__(self, parallel: int, prefill: float, per_token: float):
+        self.slots = asyncio.Semaphore(parallel)
+        self.prefill = prefill
+        self.per_token = per_token
+
+    async def generate(self, tokens: int, on_first_token=None):
+        async with self.slots:
+            await asyncio.sleep(self.prefill)
+            if on_first_token:
+                on_first_token()
+            await asyncio.sleep(self.per_token * tokens)
+
+
+async def run(scheduled: bool, backlog: int, chats: int, parallel: int):
+    ollama = StandInOllama(parallel, prefill=0.02, per_token=0.002)
+    limit = llm_scheduler.DEFAULT_MAX_IN_FLIGHT if scheduled else 10_000
+    scheduler = llm_scheduler.LLMScheduler(max_in_flight=limit)
+
+    async def background_job():
+        async with scheduler.slot(MODEL, llm_scheduler.PRIORITY_ANALYSIS):
+            await ollama.generate(tokens=20)
+
+    async def chat():
+        start = time.perf_counter()
+        first = []
+        async with scheduler.slot(MODEL, llm_scheduler.PRIORITY_CHAT):
+            await ollama.generate(tokens=100, on_first_token=lambda: first.append(time.perf_counter() - start))
+        return first[0]
+
+    background = [asyncio.create_task(background_job()) for _ in range(backlog)]
+    ttfts = []
+    for _ in range(chats):
+        await asyncio.sleep(0.05)
+        ttfts.append(await chat())
+    metrics = scheduler.metrics()[MODEL]
+    await asyncio.gather(*background)
+    return ttfts, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backlog", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--ollama-parallel", type=int, default=llm_scheduler.DEFAULT_MAX_IN_FLIGHT)
+    args = parser.parse_args()
+
+    print(f"{args.backlog} background jobs, {args.chats} sequential chats, {args.ollama_parallel} Ollama slots\n")
+    print(f"{'mode':<12} {'ttft p50 (ms)':>14} {'ttft max (ms)':>14} {'analysis avg wait (ms)':>23}")
+    for scheduled in (False, True):
+        ttfts, metrics = asyncio.run(run(scheduled, args.backlog, args.chats, args.ollama_parallel))
+        wait = metrics["wait"]["analysis"]["avg_wait_ms"]
+        label = "scheduled" if scheduled else "unscheduled"
+        print(f"{label:<12} {statistics.median(ttfts) * 1000:>14.0f} {max(ttfts) * 1000:>14.0f} {wait:>23.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Special-memory retrieval latency: LIKE scan + Python scoring vs FTS5/BM25, at 1k/10k/100k memories.
+
+Usage: python benchmarks/bench_memory_search.py [sizes...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+
+# init_db() creates memory.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+import memory  # noqa: E402
+from db import get_connection  # noqa: E402
+
+VOCABULARY = (
+    "dog puppy park walk birthday family sister brother mother father friend school university "
+    "graduated job promotion holiday beach mountain trip coffee rain sunny garden cake music "
+    "concert guitar piano painting book movie dinner wedding baby cat kitten hike bike run"
+).split()
+FILLER = "i the a my and to was we with at on in it today so very really".split()
+
+QUERIES = [
+    "I took my puppy to the park today",
+    "feeling happy about my promotion at the job",
+    "we had cake at my sister birthday dinner",
+    "remember that trip to the beach",
+]
+
+
+def seed(n):
+    rng = random.Random(n)
+    rows = []
+    for i in range(n):
+        words = rng.sample(VOCABULARY, 4) + rng.sample(FILLER, 5)
+        rng.shuffle(words)
+        rows.append((f"Memory {i}", f"{' '.join(words)} #{i}", f"2025-01-01T00:00:{i % 60:02d}"))
+    conn = get_connection(memory.MEMORY_DB)
+    with conn:
+        conn.executemany("INSERT INTO special_memories (title, memory, timestamp) VALUES (?, ?, ?)", rows)
+
+
+def timeit(fn, iterations):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    print(f"{'memories':>10} {'LIKE scan (ms)':>16} {'FTS5 BM25 (ms)':>16} {'speedup':>9}")
+    for size in sizes:
+        memory.MEMORY_DB = f"memory_{size}.db"
+        memory.init_db()
+        seed(size)
+        iterations = max(3, 20_000 // size)
+
+        like_ms = sum(
+            timeit(lambda q=q: memory._keyword_search_special_memories(q, "special_memories", 20), iterations)
+            for q in QUERIES
+        ) / len(QUERIES)
+        fts_ms = sum(
+            timeit(lambda q=q: memory.get_relevant_special_memories(q), iterations)
+            for q in QUERIES
+        ) / len(QUERIES)
+        print(f"{size:>10} {like_ms:>16.2f} {fts_ms:>16.2f} {like_ms / fts_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
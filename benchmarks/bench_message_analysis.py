@@ -0,0 +1,72 @@
+"""Background analysis cost of a message buffer: separate mood/positivity/validity prompts vs one combined
+JSON prompt per message vs numbered multi-message batches, over synthetic buffers of 10/100/1000 messages.
+
+By default the cached analysis models are replaced with a stand-in that answers each prompt type and sleeps
+in proportion to prompt length (a rough prefill model), one request at a time like a single Ollama slot, so
+LLM call counts and prompt volume are exact and timings are indicative. Mood logging is kept in memory so
+file I/O does not mask model cost. Pass --live to use the real Ollama models instead.
+
+Usage: python benchmarks/bench_message_analysis.py [--sizes 10 100 1000] [--live]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+import main  # noqa: E402
+from _standins import log_mood_in_memory, reset_stats, stats, use_analysis_standin  # noqa: E402
+
+main.init_db()
+
+MODEL_NAME = "gemma3n:e2b"
+
+MESSAGES = [
+    "I finally got the job offer I have been working towards all year!",
+    "Feeling a bit down today, the rain is not helping.",
+    "My sister and I went hiking and watched the sunrise together.",
+    "I want to start running three times a week.",
+    "Nothing special, just had lunch.",
+]
+
+
+async def run(messages, mode):
+    main.COMBINED_ANALYSIS = mode != "separate"
+    reset_stats()
+    start = time.perf_counter()
+    if mode == "batched":
+        await main.analyze_buffered_messages(messages, "en")
+    else:
+        await asyncio.gather(*(main.process_message(message, "en") for message in messages))
+    return time.perf_counter() - start, stats["calls"], stats["prompt_chars"]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--live", action="store_true", help="use the real Ollama models")
+    args = parser.parse_args()
+
+    main.log_mood = log_mood_in_memory
+    main.ANALYSIS_CACHE = False  # every mode analyzes the same messages; see bench_analysis_cache.py for replays
+    if not args.live:
+        use_analysis_standin(MODEL_NAME)
+
+    print(f"{'live Ollama' if args.live else 'stand-in model'}\n")
+    print(f"{'messages':>8} {'mode':<10} {'LLM calls':>10} {'prompt chars':>13} {'wall (s)':>9} {'ms/message':>11}")
+    for size in args.sizes:
+        messages = [f"{MESSAGES[i % len(MESSAGES)]} ({i})" for i in range(size)]
+        for mode in ("separate", "combined", "batched"):
+            wall, calls, chars = asyncio.run(run(messages, mode))
+            calls_text = f"{calls}" if not args.live else "n/a"
+            chars_text = f"{chars}" if not args.live else "n/a"
+            print(f"{size:>8} {mode:<10} {calls_text:>10} {chars_text:>13} {wall:>9.2f} {wall / size * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main_cli()
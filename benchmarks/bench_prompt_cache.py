@@ -0,0 +1,193 @@
+"""Prompt tokens Ollama has to evaluate per chat turn over a 20-turn session: the previous single-string chat
+prompt (language and context interleaved with the instructions) vs the chat-message layout (static instructions
+first, session details next, the changing memories and question last).
+
+Ollama keeps the KV cache of the last prompt in each slot and only evaluates the tokens after the longest
+prefix shared with it. By default that is simulated for one slot, with prompts rendered through a Gemma-style
+chat template and split into word/punctuation tokens, so counts are indicative rather than exact. Pass --live to
+send the prompts to Ollama (num_predict=1) and report its prompt_eval_count and prompt_eval_duration instead.
+
+With --history each turn also carries the earlier turns of its session: as text in the previous prompt's context,
+as chat messages in the layout. Scenarios: one session; two sessions (different users) taking turns on the model; one user
+alternating between two languages.
+
+Usage: python benchmarks/bench_prompt_cache.py [--turns 20] [--history] [--live] [--model gemma3n:e2b]
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import tempfile
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+import main  # noqa: E402
+
+SIM_MS_PER_TOKEN = 1.5  # rough prefill cost of a small model on a laptop CPU
+
+# The chat prompt before the chat-message layout
+LEGACY_TEMPLATE = """
+You are Mindwell, a positive, friendly, and knowledgeable AI assistant created by Mirang Bhandari (a male human). Your purpose is to support and uplift the user at all times, especially during tough situations. Always highlight the positive side and reassure the user, no matter how bad things seem. Be helpful, kind, and encouraging in every response.
+
+The user is communicating in {language_name} (language code: {language}). Your response **must** be in {language_name}.
+
+Use the conversation history **only if** the user appears sad, frustrated, anxious, or emotionally down. If the message is neutral or positive, **ignore the context completely**.
+
+Please keep the responses concise and to the point, while still being supportive and positive.
+
+Conversation history: {context}
+User message: {question}
+
+Your reply (in {language_name}):
+"""
+
+TRACKER = "Sleep tracker: the user wants to go to bed by 23:00 and log how rested they feel each morning."
+MEMORIES = [
+    "Went hiking with my sister and watched the sunrise together.",
+    "Got the job offer I had been working towards all year.",
+    "My dog learned to fetch the newspaper.",
+    "Finished my first 10k run without stopping.",
+    "Had a long call with my best friend from school.",
+]
+QUESTIONS = [
+    "I slept badly again and feel anxious about work today.",
+    "Can you suggest something to calm down before bed?",
+    "I tried the breathing exercise, it helped a little.",
+    "Work was stressful but the evening walk was nice.",
+]
+REPLY = "That sounds hard. A short walk and a calm evening routine can help you rest better tonight."
+PEOPLE = [("Anna", "en"), ("Marek", "pl")]
+
+
+def turn_inputs(turn, name, language):
+    memories = [MEMORIES[(turn + i) % len(MEMORIES)] for i in range(turn % 3 + 1)]
+    return {
+        "user_name": name,
+        "language": language,
+        "session_context": TRACKER,
+        "session_summary": "",
+        "memories": "\n".join(memories),
+        "question": f"{QUESTIONS[turn % len(QUESTIONS)]} (turn {turn})",
+    }
+
+
+def legacy_messages(inputs):
+    history = "".join(f"\nUser: {question}\nMindwell: {reply}" for question, reply in inputs["history"])
+    context = f"User's Name: {inputs['user_name']}\n{inputs['session_context']}{history}\n" + inputs["memories"]
+    prompt = LEGACY_TEMPLATE.format(
+        context=context, question=inputs["question"], language=inputs["language"],
+        language_name=main.get_language_name(inputs["language"]),
+    )
+    return [{"role": "user", "content": prompt}]
+
+
+def layout_messages(inputs):
+    prompt = main.compiled_prompt("chat", inputs["language"])
+    history = [message for question, reply in inputs["history"] for message in (("human", question), ("ai", reply))]
+    values = {k: v for k, v in inputs.items() if k not in ("language", "history")}
+    messages = prompt.format_messages(history=history, **values)
+    roles = {"system": "system", "human": "user", "ai": "assistant"}
+    return [{"role": roles[message.type], "content": message.content} for message in messages]
+
+
+def render(messages):
+    """Gemma-style chat template; system text is sent as the start of the first user turn."""
+    text, system = "<bos>", ""
+    for message in messages:
+        if message["role"] == "system":
+            system += message["content"] + "\n\n"
+            continue
+        role = "model" if message["role"] == "assistant" else "user"
+        text += f"<start_of_turn>{role}\n{system}{message['content']}<end_of_turn>\n"
+        system = ""
+    return text + "<start_of_turn>model\n"
+
+
+def tokenize(text):
+    return re.findall(r"\w+|[^\w\s]|\s+", text)
+
+
+class SimulatedSlot:
+    """One Ollama slot: evaluates only the tokens after the prefix shared with the previous prompt."""
+
+    def __init__(self):
+        self.cached = []
+
+    async def evaluate(self, messages, model):
+        tokens = tokenize(render(messages))
+        shared = 0
+        for cached, token in zip(self.cached, tokens):
+            if cached != token:
+                break
+            shared += 1
+        self.cached = tokens
+        evaluated = len(tokens) - shared
+        return len(tokens), evaluated, evaluated * SIM_MS_PER_TOKEN
+
+
+class LiveSlot:
+    """Sends the prompt to Ollama's chat API and reads back its prompt-eval counters."""
+
+    def __init__(self):
+        from ollama import AsyncClient
+        self.client = AsyncClient()
+
+    async def evaluate(self, messages, model):
+        response = await self.client.chat(model=model, messages=messages, options={"num_predict": 1})
+        evaluated = response.prompt_eval_count or 0
+        return None, evaluated, (response.prompt_eval_duration or 0) / 1e6
+
+
+def scenario_turns(scenario, turns):
+    """Yields (session, inputs) per turn."""
+    for turn in range(turns):
+        if scenario == "one session":
+            yield PEOPLE[0][0], turn_inputs(turn, *PEOPLE[0])
+        elif scenario == "two sessions":
+            yield PEOPLE[turn % 2][0], turn_inputs(turn, *PEOPLE[turn % 2])
+        else:
+            yield PEOPLE[0][0], turn_inputs(turn, PEOPLE[0][0], PEOPLE[turn % 2][1])
+
+
+async def run(layout, scenario, turns, slot, model, with_history):
+    results = []
+    histories = {}
+    for session, inputs in scenario_turns(scenario, turns):
+        history = histories.setdefault(session, [])
+        inputs["history"] = list(history)
+        results.append(await slot.evaluate(layout(inputs), model))
+        if with_history:
+            history.append((inputs["question"], REPLY))
+    return results
+
+
+async def main_async(args):
+    print(f"{'live Ollama' if args.live else 'simulated prompt cache'}, {args.turns} turns per scenario, "
+          f"{'with' if args.history else 'without'} session history\n")
+    print(f"{'scenario':<14} {'layout':<9} {'prompt (tok)':>13} {'evaluated/turn (tok)':>21} {'prompt eval/turn (ms)':>22}")
+    for scenario in ("one session", "two sessions", "two languages"):
+        for name, layout in (("previous", legacy_messages), ("layout", layout_messages)):
+            slot = LiveSlot() if args.live else SimulatedSlot()
+            results = await run(layout, scenario, args.turns, slot, args.model, args.history)
+            steady = results[1:]  # the first turn always evaluates the whole prompt
+            size = f"{statistics.mean(r[0] for r in results):.0f}" if not args.live else "n/a"
+            print(f"{scenario:<14} {name:<9} {size:>13} {statistics.mean(r[1] for r in steady):>21.0f} "
+                  f"{statistics.mean(r[2] for r in steady):>22.1f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--history", action="store_true", help="send each session's earlier turns")
+    parser.add_argument("--live", action="store_true", help="send the prompts to Ollama")
+    parser.add_argument("--model", default=main.CHAT_MODEL)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,81 @@
+"""Per-call prompt overhead in the background analysis loop: building the f-string template, parsing it with
+ChatPromptTemplate.from_template and composing prompt | model on every call (the previous behaviour) vs
+get_chain(), which compiles each prompt once per (role, language) and reuses the composed runnable.
+
+The model is an instant stand-in, so "build + invoke" is the whole cost of a call apart from the model itself.
+
+Usage: python benchmarks/bench_prompt_registry.py [--calls 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+from langchain_core.language_models.fake import FakeListLLM  # noqa: E402
+from langchain_core.prompts import ChatPromptTemplate  # noqa: E402
+
+import main  # noqa: E402
+
+QUESTION = "I finally got the job offer I have been working towards all year!"
+ROLES = ("mood", "positive", "valid", "daily_summary")
+INPUTS = {
+    "mood": {"question": QUESTION},
+    "positive": {"question": QUESTION},
+    "valid": {"question": QUESTION},
+    "daily_summary": {"existing_context": "", "conversation_context": f"user: {QUESTION}"},
+}
+
+
+def rebuild_chain(role, language, model):
+    """The previous per-call work: fill the language into an f-string, parse it and compose a new chain."""
+    text = main.PROMPT_TEMPLATES[role].replace("{language_name}", main.get_language_name(language))
+    return ChatPromptTemplate.from_template(text) | model
+
+
+async def time_calls(get, role, calls, invoke):
+    start = time.perf_counter()
+    for _ in range(calls):
+        chain = await get(role)
+        if invoke:
+            await chain.ainvoke(INPUTS[role])
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+async def run(calls):
+    model = FakeListLLM(responses=["0"])
+    main._model_instances[f"{main.ANALYSIS_MODEL}_False"] = model
+
+    async def rebuilt(role):
+        return rebuild_chain(role, "en", model)
+
+    async def registry(role):
+        return await main.get_chain(role, "en")
+
+    # Both ways must render the same prompt
+    for role in ROLES:
+        assert (await rebuilt(role)).first.format(**INPUTS[role]) == (await registry(role)).first.format(**INPUTS[role])
+
+    print(f"{calls} calls per role, instant stand-in model\n")
+    print(f"{'role':<14} {'way':<10} {'build (us/call)':>16} {'build + invoke (us/call)':>25}")
+    for role in ROLES:
+        for name, get in (("rebuild", rebuilt), ("registry", registry)):
+            build = await time_calls(get, role, calls, invoke=False)
+            total = await time_calls(get, role, calls // 4 or 1, invoke=True)
+            print(f"{role:<14} {name:<10} {build:>16.1f} {total:>25.1f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls))
+
+
+if __name__ == "__main__":
+    main_cli()
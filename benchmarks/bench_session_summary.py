@@ -0,0 +1,96 @@
+"""Chat prompt size and time-to-first-token in 10/50/200-turn sessions: every turn in the prompt vs the
+token-budgeted window alone vs the window plus a rolling summary of older turns, with the summary's cost.
+
+Turns are added to the session one at a time and, in the rolling-summary mode, followed by the same background
+step /stream runs after each reply. Then a few messages are sent through /stream. "turns covered" counts the
+turns the prompt represents, in the window or folded into the summary.
+
+Stand-in models: the chat model waits in proportion to the estimated prompt tokens before its first token,
+like prefill without a prompt cache; the analysis model answers summary prompts with a fixed ~120-word summary
+after a delay proportional to prompt length. LLM call counts and prompt sizes are exact, timings indicative.
+
+Usage: python benchmarks/bench_session_summary.py [--turns 10 50 200] [--messages 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+os.chdir(tempfile.mkdtemp(prefix="mindwell-bench-"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+import memory  # noqa: E402
+from _standins import (  # noqa: E402
+    QUESTION, REPLY, PrefillChatModel, no_memories, reset_stats, send, stats, use_analysis_standin,
+)
+
+main.init_db()
+
+MODEL_NAME = "bench-chat"
+
+
+async def play_turns(session_id, turns, summarize):
+    """Adds turns like /stream does; returns seconds spent in the background summary step."""
+    memory.upsert_chat_session(session_id, "Anna", "en", "")
+    spent = 0.0
+    for turn in range(turns):
+        memory.add_turn_to_buffer(f"{QUESTION} ({turn})", REPLY, session_id)
+        if summarize:
+            start = time.perf_counter()
+            await main.maybe_summarize_session(session_id)
+            spent += time.perf_counter() - start
+    return spent
+
+
+def turns_covered(session_id):
+    session = memory.get_chat_session(session_id)
+    context = main.build_chat_context(session, [], persist=False)
+    return session["summary_turn"] + 1 + context["turns"]
+
+
+MODES = {
+    # name: (context budget, max turns read, rolling summaries)
+    "all turns": (10 ** 9, 10 ** 9, False),
+    "window": (main.CHAT_CONTEXT_TOKENS, main.CHAT_HISTORY_MAX_TURNS, False),
+    "summary+window": (main.CHAT_CONTEXT_TOKENS, main.CHAT_HISTORY_MAX_TURNS, True),
+}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--messages", type=int, default=3)
+    args = parser.parse_args()
+
+    chat_model = PrefillChatModel(seconds_per_token=0.0002)  # ~5k tokens/s prefill
+    main._model_instances[f"{MODEL_NAME}_True_chat"] = chat_model
+    use_analysis_standin()
+    main.retrieve_special_memories = no_memories
+    client = TestClient(main.app)
+
+    print(f"stand-in prefill {chat_model.seconds_per_token * 1e6:.0f} us/token, budget {main.CHAT_CONTEXT_TOKENS} tokens, "
+          f"summary trigger {main.SESSION_SUMMARY_TRIGGER_TOKENS} tokens\n")
+    print(f"{'turns':>6} {'mode':<15} {'prompt (tok)':>13} {'TTFT p50 (ms)':>14} {'turns covered':>14} "
+          f"{'summary calls':>14} {'summary time (s)':>17}")
+    for turns in args.turns:
+        for name, (budget, max_turns, summarize) in MODES.items():
+            main.CHAT_CONTEXT_TOKENS, main.CHAT_HISTORY_MAX_TURNS, main.SESSION_SUMMARIES = budget, max_turns, summarize
+            session_id = f"{name}-{turns}"
+            reset_stats()
+            spent = asyncio.run(play_turns(session_id, turns, summarize))
+            summary_calls = stats["calls"]
+            covered = turns_covered(session_id)
+            ttfts = [send(client, session_id, MODEL_NAME) for _ in range(args.messages)]
+            print(f"{turns:>6} {name:<15} {statistics.median(stats['chat_prompt_tokens']):>13.0f} "
+                  f"{statistics.median(ttfts) * 1000:>14.1f} {covered:>14} {summary_calls:>14} {spent:>17.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
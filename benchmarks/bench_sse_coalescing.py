@@ -0,0 +1,64 @@
+"""SSE frames/sec, CPU time and time-to-first-token for /stream at different flush_ms windows.
+
+Runs the backend in-process with the deterministic echo model from load_test_stream.py.
+
+Usage: python benchmarks/bench_sse_coalescing.py [--clients 8] [--tokens 1000] [--token-delay 0.002]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from load_test_stream import MODEL_NAME, start_local_server
+
+WINDOWS_MS = (0, 16, 33, 50)
+
+
+async def run_client(client, url, client_id, flush_ms):
+    payload = {"question": f"client-{client_id}", "language": "en", "model": MODEL_NAME, "flush_ms": flush_ms}
+    start = time.perf_counter()
+    ttft = None
+    frames = 0
+    body = b""
+    async with client.stream("POST", f"{url}/stream", json=payload) as response:
+        async for chunk in response.aiter_bytes():
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            body += chunk
+    frames = body.count(b"\n\n")
+    return frames, ttft, len(body)
+
+
+async def run(url, clients, flush_ms):
+    async with httpx.AsyncClient(timeout=None) as client:
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_client(client, url, i, flush_ms) for i in range(clients)))
+        wall = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+    frames = sum(r[0] for r in results)
+    ttft_ms = sorted(r[1] for r in results)[len(results) // 2] * 1000
+    return frames, frames / wall, cpu, ttft_ms, wall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    args = parser.parse_args()
+
+    url = start_local_server(args.tokens, args.token_delay)
+    asyncio.run(run(url, 1, 0))  # warm-up
+
+    print(f"{args.clients} clients x {args.tokens} tokens, {args.token_delay * 1000:.0f} ms/token")
+    print("CPU time covers server and client, which share this process.\n")
+    print(f"{'flush_ms':>8} {'frames':>8} {'frames/s':>10} {'cpu (s)':>8} {'ttft p50 (ms)':>14} {'wall (s)':>9}")
+    for window in WINDOWS_MS:
+        frames, rate, cpu, ttft_ms, wall = asyncio.run(run(url, args.clients, window))
+        print(f"{window:>8} {frames:>8} {rate:>10.0f} {cpu:>8.2f} {ttft_ms:>14.1f} {wall:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Backend cold start: time to import main.py and run the app's startup (lifespan) in a fresh interpreter,
+with a per-package breakdown from python -X importtime. Exits non-zero when the median total is over budget.
+
+The first run warms the OS file cache and is discarded, so "cold" means a fresh interpreter rather than a
+cold disk. Heavy dependencies (langchain, langchain_ollama, langdetect, numpy) should not appear in the breakdown:
+they are imported on first use.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--budget-ms 600] [--top 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+BINARIES_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+)
+
+# Target for import + startup on a typical laptop; the Electron window waits for the backend this long
+COLD_START_BUDGET_MS = 600
+
+CHILD = """
+import asyncio, json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {binaries!r})
+import main
+imported = time.perf_counter()
+
+async def startup():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(startup())
+ready = time.perf_counter()
+lazy = [name for name in ("langchain_core", "langchain_ollama", "langdetect", "numpy") if name in sys.modules]
+print(json.dumps({{"import_ms": (imported - start) * 1000, "startup_ms": (ready - imported) * 1000, "loaded": lazy}}))
+"""
+
+
+def run_once(workdir):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(binaries=BINARIES_DIR)],
+        cwd=workdir, capture_output=True, text=True, check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # "import time: self [us] | cumulative | imported package", nested imports are indented
+    self_us = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        self_us[name.strip().split(".")[0]] += int(self_time)
+    return timings, self_us
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mindwell-startup-")
+    run_once(workdir)  # warm the file cache
+    runs = [run_once(workdir) for _ in range(args.runs)]
+
+    imports = [timings["import_ms"] for timings, _ in runs]
+    startups = [timings["startup_ms"] for timings, _ in runs]
+    totals = [i + s for i, s in zip(imports, startups)]
+    median_total = statistics.median(totals)
+
+    packages = defaultdict(list)
+    for _, self_us in runs:
+        for name, us in self_us.items():
+            packages[name].append(us)
+    heaviest = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+
+    print(f"{args.runs} fresh interpreters\n")
+    print(f"import main     median {statistics.median(imports):7.0f} ms  (min {min(imports):.0f}, max {max(imports):.0f})")
+    print(f"lifespan start  median {statistics.median(startups):7.0f} ms  (min {min(startups):.0f}, max {max(startups):.0f})")
+    print(f"total           median {median_total:7.0f} ms  budget {args.budget_ms:.0f} ms")
+    loaded = runs[0][0]["loaded"]
+    print(f"lazy modules loaded at startup: {', '.join(loaded) if loaded else 'none'}\n")
+
+    print(f"{'package':<24} {'import self time (ms)':>22}")
+    for name, values in heaviest:
+        print(f"{name:<24} {statistics.median(values) / 1000:>22.1f}")
+
+    if median_total > args.budget_ms or loaded:
+        print("\nOVER BUDGET" if median_total > args.budget_ms else "\nHeavy modules imported at startup")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
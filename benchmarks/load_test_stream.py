@@ -0,0 +1,143 @@
+"""Concurrent /stream load test: checks that every client only receives its own tokens and reports throughput.
+
+By default the backend runs in-process on uvicorn with the cached chat model replaced by a deterministic
+streaming LLM that echoes a per-client marker, so isolation can be checked exactly without Ollama. The
+stand-in has no parallelism limit, so the LLM scheduler's per-model limit is lifted to the client count.
+Pass --url to hit a running backend instead (markers are then only checked for leaks, not completeness).
+
+Usage: python benchmarks/load_test_stream.py [--clients 32] [--tokens 50] [--url http://127.0.0.1:8000]
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BINARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "electron-app", "src", "Binaries")
+MODEL_NAME = "gemma3n:e2b"
+MARKER = re.compile(r"client-(\d+)")
+
+
+def start_local_server(tokens: int, token_delay: float, max_in_flight: int = 1000) -> str:
+    """Starts main.app on a free port with a fake streaming model and returns its base URL."""
+    sys.path.insert(0, os.path.abspath(BINARIES_DIR))
+    os.chdir(tempfile.mkdtemp(prefix="mindwell-load-"))
+
+    import uvicorn
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    import main
+
+    class EchoChatModel(BaseChatModel):
+        """Streams the client marker found in the last message, one token at a time (sync and async, like ChatOllama)."""
+
+        @property
+        def _llm_type(self):
+            return "echo"
+
+        def _marker(self, messages):
+            found = MARKER.findall(messages[-1].content)
+            return f"client-{found[-1]}" if found else "client-?"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            text = "".join(chunk.text for chunk in self._stream(messages, stop, run_manager, **kwargs))
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            marker = self._marker(messages)
+            for _ in range(tokens):
+                time.sleep(token_delay)
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=f"{marker} "))
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            marker = self._marker(messages)
+            for _ in range(tokens):
+                await asyncio.sleep(token_delay)
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=f"{marker} "))
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    main._model_instances[f"{MODEL_NAME}_True_chat"] = EchoChatModel()
+    main.scheduler.configure(MODEL_NAME, max_in_flight)
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run_client(client: httpx.AsyncClient, url: str, client_id: int):
+    payload = {"question": f"Please repeat client-{client_id}", "userName": "Load", "language": "en", "model": MODEL_NAME}
+    start = time.perf_counter()
+    first_token = None
+    tokens = []
+    async with client.stream("POST", f"{url}/stream", json=payload) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            tokens.append(line[6:])
+    markers = set(MARKER.findall("".join(tokens)))
+    return {
+        "id": client_id,
+        "tokens": len(tokens),
+        "ttft": first_token,
+        "elapsed": time.perf_counter() - start,
+        "foreign": markers - {str(client_id)},
+    }
+
+
+async def run(url: str, clients: int, expected_tokens):
+    async with httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=clients)) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_client(client, url, i) for i in range(clients)))
+        wall = time.perf_counter() - start
+
+    leaked = [r for r in results if r["foreign"]]
+    incomplete = [r for r in results if expected_tokens is not None and r["tokens"] != expected_tokens]
+    total_tokens = sum(r["tokens"] for r in results)
+    ttfts = sorted(r["ttft"] for r in results if r["ttft"] is not None)
+
+    print(f"clients:              {clients}")
+    print(f"wall time:            {wall:.2f} s")
+    print(f"total tokens:         {total_tokens} ({total_tokens / wall:.0f} tokens/s)")
+    if ttfts:
+        print(f"time to first token:  p50 {ttfts[len(ttfts) // 2] * 1000:.0f} ms, max {ttfts[-1] * 1000:.0f} ms")
+    print(f"streams with leaked tokens from other clients: {len(leaked)}")
+    if expected_tokens is not None:
+        print(f"streams with missing/extra tokens:             {len(incomplete)}")
+    return not leaked and not incomplete
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--tokens", type=int, default=50, help="tokens per response for the in-process model")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds per token for the in-process model")
+    parser.add_argument("--url", help="base URL of a running backend; starts one in-process when omitted")
+    args = parser.parse_args()
+
+    url = args.url or start_local_server(args.tokens, args.token_delay)
+    ok = asyncio.run(run(url, args.clients, None if args.url else args.tokens))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# --- Connection Settings ---
+# Applied once per connection when it is opened. WAL lets readers and the
+# single writer work concurrently, NORMAL sync is safe under WAL, and the cache
+# and mmap sizes keep the hot pages of memory.db warm between requests.
+CONNECTION_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -8000),           # negative = KiB, so ~8 MB page cache
+    ("mmap_size", 64 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 5000),
+    ("foreign_keys", "ON"),
+)
+
+# Number of compiled statements each connection keeps around for reuse
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_registry = {}  # id(conn) -> conn, so close_all_connections() can reach every thread
+_registry_lock = threading.Lock()
+_generation = 0  # bumped by close_all_connections() to invalidate thread-local handles
+
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    """Opens and configures a new connection for the calling thread."""
+    conn = sqlite3.connect(
+        db_path,
+        timeout=5.0,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    with _registry_lock:
+        _registry[id(conn)] = conn
+    return conn
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """Returns the calling thread's pooled connection to db_path, opening it on first use."""
+    connections = getattr(_local, "connections", None)
+    if connections is None or getattr(_local, "generation", None) != _generation:
+        connections = _local.connections = {}
+        _local.generation = _generation
+
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = _open_connection(db_path)
+    return conn
+
+
+@contextmanager
+def transaction(db_path: str):
+    """Yields a pooled connection and commits on success, rolls back on error."""
+    conn = get_connection(db_path)
+    with conn:
+        yield conn
+
+
+def close_all_connections():
+    """Closes every pooled connection (all threads), e.g. before deleting the database file."""
+    global _generation
+    with _registry_lock:
+        _generation += 1
+        connections = list(_registry.values())
+        _registry.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,150 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+# --- Priorities (lower runs first) ---
+PRIORITY_CHAT = 0
+PRIORITY_SUMMARY = 1
+PRIORITY_ANALYSIS = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_CHAT: "chat",
+    PRIORITY_SUMMARY: "summary",
+    PRIORITY_ANALYSIS: "analysis",
+}
+
+# --- Configuration ---
+DEFAULT_MAX_IN_FLIGHT = 4  # Concurrent requests sent to Ollama per model (Ollama's usual NUM_PARALLEL)
+INTERACTIVE_RESERVE = 1    # Slots per model that only chat may use, so chat never queues behind background work
+
+
+class _PriorityStats:
+    def __init__(self):
+        self.started = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float):
+        self.started += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self):
+        return {
+            "started": self.started,
+            "avg_wait_ms": round(self.total_wait / self.started * 1000, 1) if self.started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+class _ModelQueue:
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiters = []  # heap of (priority, seq, future)
+        self.stats = {priority: _PriorityStats() for priority in PRIORITY_NAMES}
+
+    def can_start(self, priority: int) -> bool:
+        reserve = 0 if priority == PRIORITY_CHAT else min(INTERACTIVE_RESERVE, self.max_in_flight - 1)
+        return self.in_flight < self.max_in_flight - reserve
+
+
+class LLMScheduler:
+    """Limits in-flight LLM requests per model and hands free slots out by priority.
+
+    Chat requests are always served first, and background jobs (summaries, analysis) can never
+    take the slots reserved for chat, so a long background backlog does not delay the next reply.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.default_max_in_flight = max_in_flight
+        self.limits = {}  # model name -> concurrency limit set through configure()
+        self._models = {}
+        self._seq = itertools.count()
+
+    def _queue(self, model_name: str) -> _ModelQueue:
+        if model_name not in self._models:
+            self._models[model_name] = _ModelQueue(self.limits.get(model_name, self.default_max_in_flight))
+        return self._models[model_name]
+
+    def configure(self, model_name: str, max_in_flight: int = None):
+        """Sets the concurrency limit for one model; None returns it to the default limit."""
+        if max_in_flight is None:
+            self.limits.pop(model_name, None)
+        else:
+            self.limits[model_name] = max(1, int(max_in_flight))
+        queue = self._queue(model_name)
+        queue.max_in_flight = self.limits.get(model_name, self.default_max_in_flight)
+        self._wake(queue)
+
+    def set_default_max_in_flight(self, max_in_flight: int):
+        """Sets the concurrency limit of every model without one of its own."""
+        self.default_max_in_flight = max(1, int(max_in_flight))
+        for model_name in list(self._models):
+            if model_name not in self.limits:
+                self.configure(model_name)
+
+    @asynccontextmanager
+    async def slot(self, model_name: str, priority: int = PRIORITY_ANALYSIS):
+        """Waits for a free request slot on model_name and holds it for the duration of the block."""
+        queue = self._queue(model_name)
+        enqueued = time.monotonic()
+
+        # Only queue behind waiters of the same or higher priority
+        if (not queue.waiters or queue.waiters[0][0] > priority) and queue.can_start(priority):
+            queue.in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(queue.waiters, (priority, next(self._seq), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Slot was granted just as we were cancelled, give it back
+                    queue.in_flight -= 1
+                    self._wake(queue)
+                else:
+                    future.cancel()
+                raise
+
+        queue.stats[priority].record(time.monotonic() - enqueued)
+        try:
+            yield
+        finally:
+            queue.in_flight -= 1
+            self._wake(queue)
+
+    def _wake(self, queue: _ModelQueue):
+        """Grants free slots to the highest-priority waiters that are allowed to start."""
+        # Lower priorities never have a looser limit, so stop at the first waiter that cannot start
+        while queue.waiters:
+            priority, _, future = queue.waiters[0]
+            if future.done():
+                heapq.heappop(queue.waiters)
+                continue
+            if not queue.can_start(priority):
+                break
+            heapq.heappop(queue.waiters)
+            queue.in_flight += 1
+            future.set_result(None)
+
+    def metrics(self) -> dict:
+        """Queue depth, in-flight requests and wait times per model and priority."""
+        result = {}
+        for model_name, queue in self._models.items():
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, future in queue.waiters:
+                if not future.done():
+                    depth[PRIORITY_NAMES[priority]] += 1
+            result[model_name] = {
+                "max_in_flight": queue.max_in_flight,
+                "in_flight": queue.in_flight,
+                "queued": depth,
+                "wait": {PRIORITY_NAMES[p]: stats.as_dict() for p, stats in queue.stats.items()},
+            }
+        return result
+
+
+scheduler = LLMScheduler()
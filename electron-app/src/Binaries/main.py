@@ -1,19 +1,21 @@
-# Importing necessary libraries for LLM, Ollama and Speech Synthesis
-from langchain_ollama import OllamaLLM
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+# langchain, langchain_ollama and langdetect are imported on first use: together they take longer
+# to load than the rest of the backend, and the Electron app waits for the server to start
 
-# Importing necessary libraries for LLM and FastAPI
+# Importing necessary libraries for FastAPI
 from fastapi import FastAPI, Request
 from fastapi.responses import FileResponse
-import pandas as pd
 import io
+import csv
+import zipfile
 from pydantic import BaseModel
+from typing import Optional
 from fastapi.responses import StreamingResponse
 from fastapi.responses import JSONResponse
 import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+import time
+from collections import deque
 
 # Import subprocess for model download
 import os
@@ -28,25 +30,30 @@ sys.path.insert(0, current_dir)
 
 # Now you can safely import memory
 from memory import init_db
-import sqlite3
+from db import close_all_connections
 import socket
 
 # Mood imports to log for graphs
 import json
-from datetime import datetime
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta
 from memory import (
     add_special_memory, load_memories_special, get_relevant_special_memories,  
-    add_to_buffer, get_unread_buffer, delete_processed_buffer,
-    get_today_summary, upsert_today_summary,
-    update_special_memory, delete_special_memory
+    add_turn_to_buffer, get_unread_buffer, DEFAULT_SESSION_ID, claim_unread_buffer, ack_buffer,
+    get_today_summary, upsert_today_summary, get_summary_watermark,
+    get_summaries, get_summary_sources, get_summary_rollup, upsert_summary_rollup,
+    update_special_memory, delete_special_memory, get_special_memories_by_ids,
+    add_mood_entry, iter_mood_log, clear_mood_log, get_mood_rollups, MOOD_BUCKETS,
+    compact_buffer, get_storage_stats, iter_table_batches, EXPORT_TABLES,
+    get_chat_session, upsert_chat_session, get_session_history, set_session_history_turn, list_chat_sessions,
+    set_session_summary,
+    get_cached_analysis, put_cached_analysis, evict_analysis_cache, count_cached_analyses, clear_analysis_cache
 )
-
-# Import string formatters
-from titlecase import titlecase
-
-# Language detection
-from langdetect import detect
-import langdetect
+import memory
+import semantic_memory
+from llm_scheduler import scheduler, PRIORITY_CHAT, PRIORITY_SUMMARY, PRIORITY_ANALYSIS
+from functools import lru_cache
 
 # Context manager for lifespan events
 from contextlib import asynccontextmanager
@@ -81,19 +88,80 @@ LANGUAGE_NAMES = {
 }
 
 DEFAULT_LANGUAGE = 'en'  # Default fallback
+ANALYSIS_MODEL = "gemma3n:e2b"  # Background mood/memory analysis and daily summaries
+SEMANTIC_MEMORY = False  # Embedding-based memory retrieval, keyword search when off
+EMBEDDING_MODEL = semantic_memory.EMBEDDING_MODEL
+SEMANTIC_TOP_K = 5
+# Estimated tokens of session summary, recent turns and memories sent with each chat message, so prefill time
+# does not grow with the session; memories get at most CHAT_MEMORY_TOKENS of it
+CHAT_CONTEXT_TOKENS = 2000
+CHAT_MEMORY_TOKENS = 400
+CHAT_HISTORY_MAX_TURNS = 50  # Most recent turns read per message, whatever the budget
+# Once a session's unsummarized turns pass this many estimated tokens (kept below CHAT_CONTEXT_TOKENS, so turns
+# are summarized before the chat window has to drop them), all but the newest SESSION_RECENT_TURNS are folded
+# into the session summary in the background
+SESSION_SUMMARIES = True
+SESSION_SUMMARY_TRIGGER_TOKENS = 1200
+SESSION_RECENT_TURNS = 4
+SESSION_SUMMARY_WORDS = 150
+COMBINED_ANALYSIS = True  # One JSON prompt per message instead of separate mood/positivity/validity prompts
+BUFFER_RETENTION_DAYS = memory.BUFFER_RETENTION_DAYS  # Processed conversation buffer kept for compaction
+BUFFER_RETENTION_ROWS = memory.BUFFER_RETENTION_ROWS
+COMPACTION_INTERVAL = 6 * 60 * 60  # Seconds between background buffer compactions
+ANALYSIS_CACHE = True  # Reuse analysis replies for messages already analyzed with the same model and prompt
+ANALYSIS_CACHE_TTL_DAYS = memory.ANALYSIS_CACHE_TTL_DAYS
+ANALYSIS_CACHE_MAX_ENTRIES = memory.ANALYSIS_CACHE_MAX_ENTRIES
+analysis_cache_stats = {"hits": 0, "misses": 0, "evicted": 0}
+_analysis_in_flight = {}  # cache key -> task of the model call, so identical concurrent messages share one call
+last_compaction = None  # Result and time of the most recent compaction, for /storage_stats
+CHAT_MODEL = "gemma3n:e2b"  # Model the chat UI uses, warmed up at startup
+WARMUP_MODELS = True  # Load the chat and analysis models into Ollama in the background at startup
+# How long Ollama keeps a model loaded after each request, per role (Ollama duration like "30m", seconds, or -1 for
+# forever). A model serving both roles gets the longer of the two on every request (see model_keep_alive).
+KEEP_ALIVE = {"chat": "30m", "analysis": "5m"}
+model_states = {}  # model name -> warm-up state, load time and last error, for /models/state
 SETTINGS_FILE = os.path.join(os.path.dirname(__file__), "settings.json")
 
 def load_settings():
     """Load settings from file"""
-    global DEFAULT_LANGUAGE
+    global DEFAULT_LANGUAGE, SEMANTIC_MEMORY, EMBEDDING_MODEL, COMBINED_ANALYSIS
+    global BUFFER_RETENTION_DAYS, BUFFER_RETENTION_ROWS, CHAT_MODEL, WARMUP_MODELS
+    global ANALYSIS_CACHE, ANALYSIS_CACHE_TTL_DAYS, ANALYSIS_CACHE_MAX_ENTRIES, CHAT_CONTEXT_TOKENS, SESSION_SUMMARIES
     try:
         if os.path.exists(SETTINGS_FILE):
             with open(SETTINGS_FILE, 'r') as f:
                 settings = json.load(f)
                 DEFAULT_LANGUAGE = settings.get('defaultlang', 'en')
+                SEMANTIC_MEMORY = settings.get('semantic_memory', False)
+                EMBEDDING_MODEL = settings.get('embedding_model', semantic_memory.EMBEDDING_MODEL)
+                COMBINED_ANALYSIS = settings.get('combined_analysis', True)
+                BUFFER_RETENTION_DAYS = int(settings.get('buffer_retention_days', memory.BUFFER_RETENTION_DAYS))
+                BUFFER_RETENTION_ROWS = int(settings.get('buffer_retention_rows', memory.BUFFER_RETENTION_ROWS))
+                CHAT_MODEL = settings.get('chat_model', CHAT_MODEL)
+                WARMUP_MODELS = settings.get('warmup_models', True)
+                KEEP_ALIVE['chat'] = settings.get('keep_alive_chat', KEEP_ALIVE['chat'])
+                KEEP_ALIVE['analysis'] = settings.get('keep_alive_analysis', KEEP_ALIVE['analysis'])
+                ANALYSIS_CACHE = settings.get('analysis_cache', True)
+                ANALYSIS_CACHE_TTL_DAYS = int(settings.get('analysis_cache_ttl_days', memory.ANALYSIS_CACHE_TTL_DAYS))
+                ANALYSIS_CACHE_MAX_ENTRIES = int(settings.get('analysis_cache_max_entries', memory.ANALYSIS_CACHE_MAX_ENTRIES))
+                CHAT_CONTEXT_TOKENS = int(settings.get('chat_context_tokens', CHAT_CONTEXT_TOKENS))
+                SESSION_SUMMARIES = settings.get('session_summaries', True)
+                if 'llm_max_in_flight' in settings:
+                    apply_llm_max_in_flight(settings['llm_max_in_flight'])
     except Exception as e:
         logging.error(f"Error loading settings: {e}")
 
+def apply_llm_max_in_flight(value):
+    """Apply the llm_max_in_flight setting: one limit for every model, or {model: limit} with an optional
+    "default" entry for the models not listed. Models dropped from the mapping go back to the default."""
+    limits = dict(value) if isinstance(value, dict) else {"default": value}
+    limits = {model_name: max(1, int(max_in_flight)) for model_name, max_in_flight in limits.items()}
+    scheduler.set_default_max_in_flight(limits.pop("default", scheduler.default_max_in_flight))
+    for model_name in set(scheduler.limits) - set(limits):
+        scheduler.configure(model_name)
+    for model_name, max_in_flight in limits.items():
+        scheduler.configure(model_name, max_in_flight)
+
 def save_settings(settings):
     """Save settings to file"""
     try:
@@ -102,68 +170,346 @@ def save_settings(settings):
     except Exception as e:
         logging.error(f"Error saving settings: {e}")
 
+def current_settings():
+    """Current values of all persisted settings"""
+    return {
+        'defaultlang': DEFAULT_LANGUAGE,
+        'semantic_memory': SEMANTIC_MEMORY,
+        'embedding_model': EMBEDDING_MODEL,
+        'combined_analysis': COMBINED_ANALYSIS,
+        'llm_max_in_flight': {'default': scheduler.default_max_in_flight, **scheduler.limits},
+        'buffer_retention_days': BUFFER_RETENTION_DAYS,
+        'buffer_retention_rows': BUFFER_RETENTION_ROWS,
+        'chat_model': CHAT_MODEL,
+        'warmup_models': WARMUP_MODELS,
+        'keep_alive_chat': KEEP_ALIVE['chat'],
+        'keep_alive_analysis': KEEP_ALIVE['analysis'],
+        'analysis_cache': ANALYSIS_CACHE,
+        'analysis_cache_ttl_days': ANALYSIS_CACHE_TTL_DAYS,
+        'analysis_cache_max_entries': ANALYSIS_CACHE_MAX_ENTRIES,
+        'chat_context_tokens': CHAT_CONTEXT_TOKENS,
+        'session_summaries': SESSION_SUMMARIES,
+    }
+
 # --- Helper Functions ---
-async def get_model_instance(model_name: str = "gemma3n:e2b", streaming: bool = False, callbacks: list = None):
-    """Get or create cached model instances for better performance"""
+async def get_model_instance(model_name: str = "gemma3n:e2b", streaming: bool = False, chat: bool = False,
+                             schema: str = None):
+    """Get or create cached model instances for better performance.
+
+    Instances (and their HTTP clients) are shared by all requests, so per-request callbacks
+    must be passed through the invoke config rather than set on the model. chat=True gives a
+    ChatOllama model that takes a list of messages (Ollama's chat API) instead of one prompt string.
+    schema names an OUTPUT_SCHEMAS entry: a ChatOllama model whose replies Ollama constrains to that JSON schema.
+    """
     global _model_instances
     
     # Create unique cache key based on model name and streaming capability
-    cache_key = f"{model_name}_{streaming}"
+    cache_key = f"{model_name}_{streaming}" + (f"_{schema}" if schema else "") + ("_chat" if chat else "")
     
     async with _model_lock:
         if cache_key not in _model_instances:
-            _model_instances[cache_key] = OllamaLLM(
-                model=model_name,
-                streaming=streaming
-            )
+            keep_alive = model_keep_alive(model_name, "chat" if streaming else "analysis")
+            if chat or schema:
+                # Only the chat model takes a JSON schema as its format; OllamaLLM is limited to "json"
+                from langchain_ollama import ChatOllama
+                _model_instances[cache_key] = ChatOllama(
+                    model=model_name,
+                    format=OUTPUT_SCHEMAS[schema] if schema else None,
+                    keep_alive=keep_alive
+                )
+            else:
+                from langchain_ollama import OllamaLLM
+                _model_instances[cache_key] = OllamaLLM(
+                    model=model_name,
+                    streaming=streaming,
+                    keep_alive=keep_alive
+                )
             logging.info(f"Created new model instance: {cache_key}")
         
-        model = _model_instances[cache_key]
-        
-        # Set callbacks if provided (for streaming)
-        if callbacks is not None:
-            model.callbacks = callbacks
-        
-        return model
+        return _model_instances[cache_key]
+
+def model_roles():
+    """Roles served by each configured model, e.g. {"gemma3n:e2b": ["chat", "analysis"]}"""
+    roles = {}
+    roles.setdefault(CHAT_MODEL, []).append("chat")
+    roles.setdefault(ANALYSIS_MODEL, []).append("analysis")
+    return roles
+
+KEEP_ALIVE_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def keep_alive_seconds(value) -> float:
+    """Seconds an Ollama keep_alive value ("30m", "1h30m", 300, -1) keeps a model loaded; negative means forever"""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        text = str(value).strip()
+        seconds = sum(float(number) * KEEP_ALIVE_UNITS[unit]
+                      for number, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", text))
+        if text.startswith("-"):
+            seconds = -seconds
+    return float("inf") if seconds < 0 else seconds
+
+def model_keep_alive(model_name: str, role: str = "chat"):
+    """keep_alive sent with every request to a model: the longest of its roles' values, so a model that serves
+    both chat and analysis keeps the chat timer. Models outside the configuration use the requesting role's."""
+    roles = model_roles().get(model_name, [role])
+    return max((KEEP_ALIVE[r] for r in roles), key=keep_alive_seconds)
+
+def set_model_state(model_name: str, state: str, **details):
+    model_states[model_name] = {"state": state, "updated_at": datetime.now().isoformat(), **details}
+
+async def warm_up_model(model_name: str, keep_alive):
+    """Ask Ollama to load a model without generating anything, so the first real request skips the load"""
+    set_model_state(model_name, "loading")
+    started = time.monotonic()
+    try:
+        from ollama import AsyncClient
+        await AsyncClient().generate(model=model_name, prompt="", keep_alive=keep_alive)
+        set_model_state(model_name, "ready", load_ms=round((time.monotonic() - started) * 1000))
+        logging.info(f"Warmed up model {model_name} in {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        # Missing models are downloaded by the first chat request, not here
+        state = "missing" if "not found" in str(e).lower() else "error"
+        set_model_state(model_name, state, error=str(e))
+        logging.warning(f"Could not warm up model {model_name}: {e}")
+
+async def warm_up_models():
+    """Load every configured model with the keep_alive its requests use"""
+    await asyncio.gather(*(warm_up_model(model_name, model_keep_alive(model_name)) for model_name in model_roles()))
+
+async def loaded_models():
+    """Models Ollama currently holds in memory (name -> details), or None when Ollama is not reachable"""
+    try:
+        from ollama import AsyncClient
+        response = await AsyncClient().ps()
+    except Exception as e:
+        logging.warning(f"Could not list loaded models: {e}")
+        return None
+    loaded = {}
+    for model in response.models:
+        expires_at = getattr(model, "expires_at", None)
+        loaded[model.model] = {
+            "expires_at": expires_at.isoformat() if expires_at else None,
+            "size_vram": getattr(model, "size_vram", None),
+        }
+    return loaded
+
+async def run_llm(chain, inputs: dict, model_name: str = ANALYSIS_MODEL, priority: int = PRIORITY_ANALYSIS):
+    """Invoke a chain once the scheduler grants a request slot for its model; returns the reply text"""
+    async with scheduler.slot(model_name, priority):
+        result = await chain.ainvoke(inputs)
+    # Chat models (the schema-constrained analysis ones) reply with a message, completion models with text
+    return getattr(result, "content", result)
+
+@lru_cache(maxsize=256)
+def compiled_prompt(role: str, language: str, **params):
+    """ChatPromptTemplate for a PROMPT_TEMPLATES role with the language (and e.g. the summary period) bound,
+    parsed once per (role, language, params)"""
+    from langchain_core.prompts import ChatPromptTemplate
+    template = PROMPT_TEMPLATES[role]
+    if isinstance(template, str):
+        prompt = ChatPromptTemplate.from_template(template)
+    else:
+        prompt = ChatPromptTemplate.from_messages(template)
+    bound = {"language": language, "language_name": get_language_name(language), **params}
+    return prompt.partial(**{name: value for name, value in bound.items() if name in prompt.input_variables})
+
+_chain_instances = {}  # (role, language, params, model cache key) -> prompt | model runnable
+
+async def get_chain(role: str, language: str, model_name: str = None, streaming: bool = False,
+                    chat: bool = False, schema: str = None, **params):
+    """Composed prompt | model runnable for a role, built once and reused by every call with the same
+    language and model settings"""
+    model_name = model_name or ANALYSIS_MODEL
+    model = await get_model_instance(model_name, streaming=streaming, chat=chat, schema=schema)
+    key = (role, language, tuple(sorted(params.items())), model_name, streaming, chat, schema)
+    chain = _chain_instances.get(key)
+    # Model instances are recreated when keep_alive changes, so the chain is rebuilt around the new one
+    if chain is None or chain.last is not model:
+        chain = _chain_instances[key] = compiled_prompt(role, language, **params) | model
+    return chain
+
+def normalize_analysis_input(text: str) -> str:
+    """Message text as used in analysis cache keys: Unicode NFC with whitespace runs collapsed"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def analysis_cache_key(model_name: str, template: str, question: str, language: str, schema: str = None) -> str:
+    """Content address of an analysis reply: any change to the model, prompt wording, output schema or message
+    gives a new key"""
+    template_hash = hashlib.sha256(template.encode("utf-8")).hexdigest()
+    output_format = json.dumps(OUTPUT_SCHEMAS[schema], sort_keys=True) if schema else None
+    payload = json.dumps([model_name, template_hash, output_format, language, normalize_analysis_input(question)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def lookup_cached_analysis(key: str, count_miss: bool = True):
+    """Cached reply for key (None on a miss or when the cache is off), counted in analysis_cache_stats"""
+    if not ANALYSIS_CACHE:
+        return None
+    try:
+        result = get_cached_analysis(key, ANALYSIS_CACHE_TTL_DAYS)
+    except Exception as e:
+        logging.error(f"Error reading analysis cache: {e}")
+        result = None
+    if result is not None:
+        analysis_cache_stats["hits"] += 1
+    elif count_miss:
+        analysis_cache_stats["misses"] += 1
+    return result
+
+def store_cached_analysis(key: str, result: str):
+    if not ANALYSIS_CACHE:
+        return
+    try:
+        put_cached_analysis(key, result)
+    except Exception as e:
+        logging.error(f"Error writing analysis cache: {e}")
+
+async def run_cached_analysis(role: str, question: str, language: str, schema: str = None,
+                              cacheable=lambda result: bool(result.strip())) -> str:
+    """Reply of the analysis model to the role's prompt filled with question, served from the analysis cache when
+    the same model already answered the same prompt for the same message. Only replies accepted by cacheable are
+    stored, so a malformed reply is retried next time instead of being replayed.
+    """
+    key = analysis_cache_key(ANALYSIS_MODEL, PROMPT_TEMPLATES[role], question, language, schema)
+    if ANALYSIS_CACHE and key in _analysis_in_flight:
+        analysis_cache_stats["hits"] += 1
+        return await asyncio.shield(_analysis_in_flight[key])
+    cached = lookup_cached_analysis(key)
+    if cached is not None:
+        return cached
+
+    async def call_model():
+        chain = await get_chain(role, language, schema=schema)
+        result = str(await run_llm(chain, {"question": question}))
+        if cacheable(result):
+            store_cached_analysis(key, result)
+        return result
+
+    if not ANALYSIS_CACHE:
+        return await call_model()
+    task = _analysis_in_flight[key] = asyncio.ensure_future(call_model())
+    task.add_done_callback(lambda _: _analysis_in_flight.pop(key, None))
+    # Shielded so a cancelled caller does not cancel the call for the others waiting on it
+    return await asyncio.shield(task)
+
+def evict_analysis_cache_now():
+    """Drop expired and least recently used analysis cache entries beyond the configured limits"""
+    try:
+        analysis_cache_stats["evicted"] += evict_analysis_cache(ANALYSIS_CACHE_MAX_ENTRIES, ANALYSIS_CACHE_TTL_DAYS)
+    except Exception as e:
+        logging.error(f"Error evicting analysis cache: {e}")
 
 def detect_language(text: str) -> str:
     """Detect language of text with fallback to English"""
     try:
+        from langdetect import detect
         detected = detect(text)
         return detected if detected in LANGUAGE_NAMES else 'en'
-    except (langdetect.lang_detect_exception.LangDetectException, Exception):
+    except Exception:
         return 'en'
 
 def get_language_name(code: str) -> str:
     """Get full language name from code"""
     return LANGUAGE_NAMES.get(code, 'English')
 
+async def retrieve_special_memories(question: str):
+    """Semantic memory retrieval when enabled, falling back to keyword matching"""
+    if SEMANTIC_MEMORY:
+        try:
+            matches = await semantic_memory.search_memories(question, SEMANTIC_TOP_K, EMBEDDING_MODEL)
+            if matches:
+                return get_special_memories_by_ids([memory_id for memory_id, _ in matches])
+        except Exception as e:
+            logging.warning(f"Semantic memory search failed, using keyword search: {e}")
+    return get_relevant_special_memories(question)
+
+async def sync_semantic_index():
+    """Embed any special memories missing from the vector index (e.g. after enabling the feature)"""
+    try:
+        memories = [(mem['id'], mem['memory']) for mem in load_memories_special()]
+        await semantic_memory.sync_index(memories, EMBEDDING_MODEL)
+    except Exception as e:
+        logging.error(f"Error syncing semantic memory index: {e}")
+
+async def compact_buffer_now():
+    """Apply the buffer retention policy off the event loop and remember the result"""
+    global last_compaction
+    # With session summaries on, turns not yet summarized are kept for the summary as well as the chat window
+    result = await asyncio.to_thread(
+        compact_buffer, BUFFER_RETENTION_DAYS, BUFFER_RETENTION_ROWS, keep_unsummarized=SESSION_SUMMARIES
+    )
+    last_compaction = {**result, "at": datetime.now().isoformat()}
+    if result["deleted_rows"]:
+        logging.info(f"Compacted conversation buffer: {result}")
+    return last_compaction
+
+async def buffer_compaction_loop():
+    """Background task: compact the processed conversation buffer every COMPACTION_INTERVAL seconds"""
+    while True:
+        try:
+            await compact_buffer_now()
+        except Exception as e:
+            logging.error(f"Error compacting conversation buffer: {e}")
+        await asyncio.sleep(COMPACTION_INTERVAL)
+
 async def log_mood(mood: int):
     """Log mood with better error handling"""
-    entry = {"mood": mood, "timestamp": datetime.now().isoformat()}
     try:
-        if os.path.exists("mood_log.json"):
-            with open("mood_log.json", "r+", encoding='utf-8') as f:
-                try:
-                    data = json.load(f)
-                except json.JSONDecodeError:
-                    data = []
-                data.append(entry)
-                f.seek(0)
-                f.truncate()
-                json.dump(data, f, indent=4, ensure_ascii=False)
-        else:
-            with open("mood_log.json", "w", encoding='utf-8') as f:
-                json.dump([entry], f, indent=4, ensure_ascii=False)
+        add_mood_entry(mood)
     except Exception as e:
         logging.error(f"Error logging mood: {e}")
 
+# Chart value of each mood code (0 happy, 1 sad, 2 neutral), same scale as the wellness graph
+MOOD_SCORES = {0: 2, 1: 0, 2: 1}
+
+def mood_window_start(bucket: str, period: str, window: int) -> str:
+    """Key of the first of the `window` calendar periods ending with period, e.g. 7 days back to the 6th day before"""
+    back = window - 1
+    try:
+        if bucket == "month":
+            year, month = map(int, period.split("-"))
+            index = year * 12 + month - 1 - back
+            return f"{index // 12:04d}-{index % 12 + 1:02d}"
+        if bucket == "hour":
+            return (datetime.strptime(period, "%Y-%m-%dT%H") - timedelta(hours=back)).strftime("%Y-%m-%dT%H")
+        days = back * 7 if bucket == "week" else back
+        return (datetime.strptime(period, "%Y-%m-%d") - timedelta(days=days)).strftime("%Y-%m-%d")
+    except (ValueError, OverflowError):
+        return ""  # window reaches before year 1, so it covers every period
+
+def summarize_mood_periods(periods, window: int, bucket: str = "day"):
+    """Add per-period totals, average mood score and a rolling average over the last `window` calendar periods.
+
+    Periods without entries count towards the window, so a 7-day average never reaches further back than 7 days.
+    """
+    summarized = []
+    recent = deque()  # (period, score_sum, total) of the trailing window
+    for entry in periods:
+        counts = entry["counts"]
+        total = sum(counts.values())
+        score_sum = sum(MOOD_SCORES.get(mood, 1) * count for mood, count in counts.items())
+        recent.append((entry["period"], score_sum, total))
+        start = mood_window_start(bucket, entry["period"], window)
+        while recent[0][0] < start:
+            recent.popleft()
+        rolling_total = sum(t for _, _, t in recent)
+        summarized.append({
+            "period": entry["period"],
+            "counts": [counts.get(mood, 0) for mood in sorted(MOOD_SCORES)],
+            "score": round(score_sum / total, 2) if total else None,
+            "rolling": round(sum(s for _, s, _ in recent) / rolling_total, 2) if rolling_total else None,
+        })
+    return summarized
+
 class QueryRequest(BaseModel):
     question: str
-    userName: str = "User"
-    context: str = ""
+    userName: Optional[str] = None  # None keeps the name stored for the session ("User" for a new one)
+    context: Optional[str] = None  # None keeps the context stored for the session
     model: str = "gemma3n:e2b"
     language: str = ""  # Auto-detect if empty
+    flush_ms: int = 0  # Coalesce tokens into one SSE frame per window (e.g. 16-50), 0 = one frame per token
+    flush_bytes: int = 0  # Also flush a frame once it reaches this size, 0 = no size limit
+    session_id: str = DEFAULT_SESSION_ID  # Conversation this turn belongs to; its history is kept server-side
     
 class MoodRequest(BaseModel):
     graph: int
@@ -182,30 +528,96 @@ class MemoryDeleteRequest(BaseModel):
     id: int
     table: str
 
-class CustomHandler(StreamingStdOutCallbackHandler):
-    def __init__(self):
-        self.buffer = ""
-        super().__init__()
-        self.queue = asyncio.Queue()
-        self._finished = False
-
-    async def on_llm_new_token(self, token: str, **kwargs) -> None:
-        self.buffer += token
-        await self.queue.put(token)
-            
-    async def token_stream(self):
+def sse_frame(data: str) -> bytes:
+    """Encode one Server-Sent Events data frame (UTF-8 for multilingual tokens).
+
+    Each line of data gets its own data: field, so chunks holding newlines arrive whole.
+    """
+    return ("".join(f"data: {line}\n" for line in data.split("\n")) + "\n").encode("utf-8")
+
+async def coalesce_tokens(tokens, flush_ms: int = 0, flush_bytes: int = 0):
+    """Group streamed tokens into larger chunks to cut per-frame write and dispatch overhead.
+
+    The first token is always sent on its own so time-to-first-token is unchanged. After that a
+    chunk is sent once flush_ms has passed since its first token or it reaches flush_bytes.
+    """
+    if flush_ms <= 0 and flush_bytes <= 0:
+        async for token in tokens:
+            yield token
+        return
+
+    window = flush_ms / 1000
+    iterator = tokens.__aiter__()
+    first = True
+    buffer = []
+    size = 0
+    deadline = None  # when the buffered chunk is due, with flush_ms set
+    pending = None  # task waiting for the next token; never cancelled by a timeout, so the stream stays intact
+    try:
         while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # The window ran out before the next token: send what is buffered now
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+                continue
+            task, pending = pending, None
             try:
-                token = await asyncio.wait_for(self.queue.get(), timeout=30.0)
-                if token == "[END]":
-                    break
-                # Fix UTF-8 encoding for streaming
-                yield f"data: {token}\n\n".encode("utf-8")
-            except asyncio.TimeoutError:
-                break
-            except Exception as e:
-                logging.error(f"Streaming error: {e}")
+                token = task.result()
+            except StopAsyncIteration:
                 break
+            if first:
+                first = False
+                yield token
+                continue
+            if not buffer and flush_ms > 0:
+                deadline = time.monotonic() + window
+            buffer.append(token)
+            size += len(token.encode("utf-8"))
+            if (flush_bytes > 0 and size >= flush_bytes) or (deadline is not None and time.monotonic() >= deadline):
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+    finally:
+        if pending is not None:
+            pending.cancel()
+    if buffer:
+        yield "".join(buffer)
+
+async def message_tokens(chunks, on_done=None):
+    """Text of streamed chat message chunks; the final chunk's Ollama stats (prompt_eval_count etc.) go to on_done"""
+    async for chunk in chunks:
+        if on_done and chunk.response_metadata.get("done"):
+            on_done(chunk.response_metadata)
+        if chunk.content:
+            yield chunk.content
+
+CHAT_PROMPT_EVAL_WINDOW = 100  # Recent chat turns kept per model for the prompt-eval stats in /llm_metrics
+chat_prompt_evals = {}  # model name -> deque of (prompt tokens evaluated, prompt eval ms)
+
+def record_prompt_eval(model_name: str, info: dict):
+    """Remember how many prompt tokens Ollama had to evaluate for a chat turn; tokens reused from its prompt
+    cache are not counted, so this stays small while consecutive prompts share their prefix"""
+    evaluated = info.get("prompt_eval_count")
+    if evaluated is None:
+        return
+    eval_ms = (info.get("prompt_eval_duration") or 0) / 1e6
+    chat_prompt_evals.setdefault(model_name, deque(maxlen=CHAT_PROMPT_EVAL_WINDOW)).append((evaluated, eval_ms))
+    logging.info(f"Chat prompt for {model_name}: {evaluated} tokens evaluated in {eval_ms:.0f} ms")
+
+def prompt_eval_metrics(model_name: str):
+    evals = chat_prompt_evals.get(model_name)
+    if not evals:
+        return None
+    return {
+        "turns": len(evals),
+        "last_tokens": evals[-1][0],
+        "last_ms": round(evals[-1][1], 1),
+        "mean_tokens": round(sum(tokens for tokens, _ in evals) / len(evals), 1),
+        "mean_ms": round(sum(ms for _, ms in evals) / len(evals), 1),
+    }
 
 # --- Lifespan Event Handler ---
 from contextlib import asynccontextmanager
@@ -214,8 +626,15 @@ from contextlib import asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logging.info("Starting up FastAPI application")
+    init_db()
     load_settings()  # Load settings on startup
+    if WARMUP_MODELS:
+        asyncio.create_task(warm_up_models())
+    if SEMANTIC_MEMORY:
+        asyncio.create_task(sync_semantic_index())
+    compaction_task = asyncio.create_task(buffer_compaction_loop())
     yield
+    compaction_task.cancel()
     # Shutdown
     global _model_instances
     async with _model_lock:
@@ -234,73 +653,358 @@ app.add_middleware(
 )
 
 # --- Prompt Templates ---
-template = """
-You are Mindwell, a positive, friendly, and knowledgeable AI assistant created by Mirang Bhandari (a male human). Your purpose is to support and uplift the user at all times, especially during tough situations. Always highlight the positive side and reassure the user, no matter how bad things seem. Be helpful, kind, and encouraging in every response.
+# The chat prompt is laid out for Ollama's prompt cache, which skips prefill for the longest prefix shared
+# with the previous request: text that never changes comes first, then what is fixed for a session, then the
+# turns so far, and only the last message changes from turn to turn.
+chat_instructions = """You are Mindwell, a positive, friendly, and knowledgeable AI assistant created by Mirang Bhandari (a male human). Your purpose is to support and uplift the user at all times, especially during tough situations. Always highlight the positive side and reassure the user, no matter how bad things seem. Be helpful, kind, and encouraging in every response.
 
+Always reply in the language stated below. Use the context and memories you are given **only if** the user appears sad, frustrated, anxious, or emotionally down. If the message is neutral or positive, **ignore them completely**.
+
+Please keep the responses concise and to the point, while still being supportive and positive.
+"""
+
+chat_session_template = """
+User's name: {user_name}
 The user is communicating in {language_name} (language code: {language}). Your response **must** be in {language_name}.
+Context: {session_context}
+Summary of the earlier conversation: {session_summary}"""
 
-Use the conversation history **only if** the user appears sad, frustrated, anxious, or emotionally down. If the message is neutral or positive, **ignore the context completely**.
+chat_turn_template = """Relevant memories: {memories}
 
-Please keep the responses concise and to the point, while still being supportive and positive.
+User message: {question}
+
+Your reply (in {language_name}):"""
+
+chat_template = (
+    ("system", chat_instructions + chat_session_template),
+    ("placeholder", "{history}"),
+    ("human", chat_turn_template),
+)
+
+mood_template = """
+Analyze the user's emotional tone from the following message in {language_name} and respond with a single digit: 0 for happy, 1 for sad, or 2 for neutral. Do not provide any other text or explanation.
 
-Conversation history: {context}
 User message: {question}
+Your response:
+"""
+
+positive_template = """Analyze the user's message in {language_name} and determine if it's a special positive memory worth remembering.
+Respond with 'special: <title>' in {language_name} if it is, 'yes' if it is just a positive memory and 'no' if none of the above. Do not provide any other text or explanation.
 
-Your reply (in {language_name}):
+User message: {question}
+Your response:
 """
-prompt = ChatPromptTemplate.from_template(template)
+
+valid_template = """
+You are a memory filter AI. Analyze the user's message in {language_name}.
+Your task is to determine if the message contains any factual, personal, or goal-related information that should be stored in memory.
+Respond strictly in this format:
+validity: true/false
+type: <category like name, location, goal, preference>
+value: <summarized version of the message, clearly expressed as a fact>
+
+User message: {question}
+"""
+
+ANALYSIS_FIELDS = """
+- mood: the user's emotional tone as a single digit: 0 for happy, 1 for sad, or 2 for neutral.
+- memory: "special" if the message is a special positive memory worth remembering, "positive" if it is just a positive memory, otherwise "none".
+- title: a short title in {language_name} when memory is "special", otherwise "".
+- fact: valid is true if the message contains factual, personal, or goal-related information that should be stored in memory; type is a category like name, location, goal, preference; value is a summarized version of the message, clearly expressed as a fact.
+"""
+
+message_analysis_template = """
+Analyze the following user message written in {language_name}. Reply with a single JSON object and nothing else, using exactly these keys:
+{{"mood": 0, "memory": "none", "title": "", "fact": {{"valid": false, "type": "", "value": ""}}}}
+""" + ANALYSIS_FIELDS + """
+User message: {question}
+"""
+
+batch_analysis_template = """
+Analyze each of the following numbered user messages written in {language_name}. Reply with a single JSON object and nothing else, in this form:
+{{"results": [{{"id": 1, "mood": 0, "memory": "none", "title": "", "fact": {{"valid": false, "type": "", "value": ""}}}}]}}
+Include exactly one result per message, using the message number as "id". For each message:
+""" + ANALYSIS_FIELDS + """
+User messages:
+{messages}
+"""
+
+# JSON schemas Ollama constrains the analysis replies to; parsing stays lenient (normalize_message_analysis)
+# for models or Ollama versions that do not follow them
+MESSAGE_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "mood": {"type": "integer", "enum": [0, 1, 2]},
+        "memory": {"type": "string", "enum": ["none", "special", "positive"]},
+        "title": {"type": "string"},
+        "fact": {
+            "type": "object",
+            "properties": {
+                "valid": {"type": "boolean"},
+                "type": {"type": "string"},
+                "value": {"type": "string"},
+            },
+            "required": ["valid", "type", "value"],
+        },
+    },
+    "required": ["mood", "memory", "title", "fact"],
+}
+BATCH_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, **MESSAGE_ANALYSIS_SCHEMA["properties"]},
+                "required": ["id", *MESSAGE_ANALYSIS_SCHEMA["required"]],
+            },
+        },
+    },
+    "required": ["results"],
+}
+OUTPUT_SCHEMAS = {
+    "message_analysis": MESSAGE_ANALYSIS_SCHEMA,
+    "batch_analysis": BATCH_ANALYSIS_SCHEMA,
+}
+
+summary_notes_template = """
+Read this part of a conversation between a user and a mental health assistant, in {language_name}.
+Write brief notes in {language_name} on the user's mood, feelings, events and concerns.
+Return only the notes as a few short bullet points.
+
+Conversation: {conversation_context}
+"""
+
+daily_summary_template = """
+You are a helpful, empathetic mental health assistant. Your task is to read the conversation in {language_name} and generate:
+
+1. A short, emotionally aware summary of the user's mental and emotional state in {language_name}.
+2. Three actionable, supportive tips in {language_name}.
+
+You must reply strictly in the following format and say nothing else:
+
+### Summary
+<Concise, emotionally intelligent summary here in {language_name}>
+
+### Tips
+- <Actionable, supportive tip 1 in {language_name}>
+- <Actionable, supportive tip 2 in {language_name}>
+- <Actionable, supportive tip 3 in {language_name}>
+
+Only return this format. Do not add explanations, prefaces, or confirmations.
+
+Context (if any): {existing_context}  
+Conversation: {conversation_context}
+"""
+
+rollup_template = """
+You are a helpful, empathetic mental health assistant. Below are daily summaries of the user's emotional state over one {period}, in {language_name}. Generate:
+
+1. A short summary in {language_name} of how the user's mood and wellbeing developed over the {period}, noting trends.
+2. Three actionable, supportive tips in {language_name}.
+
+You must reply strictly in the following format and say nothing else:
+
+### Summary
+<Concise summary of the {period} here in {language_name}>
+
+### Tips
+- <Actionable, supportive tip 1 in {language_name}>
+- <Actionable, supportive tip 2 in {language_name}>
+- <Actionable, supportive tip 3 in {language_name}>
+
+Daily summaries: {daily_summaries}
+"""
+
+session_summary_template = """
+Below is a summary of the earlier part of a conversation between a user and Mindwell, a supportive assistant, followed by the turns that came after it, in {language_name}.
+Write an updated summary in {language_name} that keeps what matters for continuing the conversation: the user's feelings and situation, events, people, goals, and anything the assistant suggested or promised.
+Return only the summary, in at most {max_words} words.
+
+Summary so far: {summary}
+
+Conversation since then: {conversation}
+"""
+
+# Every prompt by role; get_chain() compiles each once per language (and period) and reuses the runnable
+PROMPT_TEMPLATES = {
+    "chat": chat_template,
+    "mood": mood_template,
+    "positive": positive_template,
+    "valid": valid_template,
+    "message_analysis": message_analysis_template,
+    "batch_analysis": batch_analysis_template,
+    "summary_notes": summary_notes_template,
+    "daily_summary": daily_summary_template,
+    "rollup": rollup_template,
+    "session_summary": session_summary_template,
+}
 
 # --- Analysis Functions (for background processing) ---
+def parse_mood_reply(result: str):
+    """First digit of the mood reply if it is a valid mood (0, 1 or 2), else None"""
+    digits = re.findall(r'\d', str(result))
+    return int(digits[0]) if digits and digits[0] in ("0", "1", "2") else None
+
 async def analyze_and_log_mood(question: str, language: str):
     """Improved mood analysis with multilingual support and cached model"""
     language_name = get_language_name(language)
-    mood_template = f"""
-Analyze the user's emotional tone from the following message in {language_name} and respond with a single digit: 0 for happy, 1 for sad, or 2 for neutral. Do not provide any other text or explanation.
-
-User message: {{question}}
-Your response:
-"""
-    mood_prompt = ChatPromptTemplate.from_template(mood_template)
     try:
-        # Use cached non-streaming model instance
-        model = await get_model_instance("gemma3n:e2b", streaming=False)
-        chain = mood_prompt | model
-        result = await asyncio.to_thread(chain.invoke, {"question": question})
-        
-        # More robust parsing
-        mood_str = str(result).strip()
-        # Extract only digits
-        digits = re.findall(r'\d', mood_str)
-        if digits and digits[0] in ["0", "1", "2"]:
-            await log_mood(int(digits[0]))
-            logging.info(f"Mood logged: {digits[0]} for language: {language_name}")
+        result = await run_cached_analysis(
+            "mood", question, language, cacheable=lambda reply: parse_mood_reply(reply) is not None
+        )
+        mood = parse_mood_reply(result)
+        if mood is not None:
+            await log_mood(mood)
+            logging.info(f"Mood logged: {mood} for language: {language_name}")
         else:
-            logging.warning(f"Invalid mood result: {mood_str}")
+            logging.warning(f"Invalid mood result: {result.strip()}")
     except Exception as e:
         logging.error(f"Error during mood analysis: {str(e)}")
 
 async def is_positive(question: str, language: str):
     """Improved positivity analysis with multilingual support and cached model"""
-    language_name = get_language_name(language)
-    positive_template = f"""Analyze the user's message in {language_name} and determine if it's a special positive memory worth remembering.
-Respond with 'special: <title>' in {language_name} if it is, 'yes' if it is just a positive memory and 'no' if none of the above. Do not provide any other text or explanation.
-
-User message: {{question}}
-Your response:
-"""
-    positive_prompt = ChatPromptTemplate.from_template(positive_template)
     try:
-        # Use cached non-streaming model instance
-        model = await get_model_instance("gemma3n:e2b", streaming=False)
-        chain = positive_prompt | model
-        result = await asyncio.to_thread(chain.invoke, {"question": question})
+        result = await run_cached_analysis("positive", question, language)
         return str(result).strip().lower()
     except Exception as e:
         logging.error(f"Error during positivity analysis: {str(e)}")
         return "no"
 
-async def download_model_background(model_name, handler):
-    """Improved model download with better progress tracking"""
+# Batches are packed up to this many estimated prompt tokens / messages, whichever comes first
+ANALYSIS_BATCH_TOKENS = 1500
+ANALYSIS_BATCH_SIZE = 20
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting prompts"""
+    return len(text) // 4 + 1
+
+def extract_json(raw: str):
+    """Return the outermost JSON object in a model reply, or {} if there is none"""
+    match = re.search(r"\{.*\}", str(raw), re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError:
+            pass
+    return {}
+
+def parse_message_analysis(raw: str) -> dict:
+    """Parse the combined analysis reply, tolerating extra text and missing or malformed fields"""
+    return normalize_message_analysis(extract_json(raw))
+
+def normalize_message_analysis(data) -> dict:
+    """Coerce one analysis result into the fields process_message expects"""
+    if not isinstance(data, dict):
+        data = {}
+
+    mood = str(data.get("mood", "")).strip()
+    memory = str(data.get("memory", "none")).strip().lower()
+    fact = data.get("fact") if isinstance(data.get("fact"), dict) else {}
+    fact_type = str(fact.get("type") or "").strip()
+    validity = str(fact.get("valid", "")).strip().lower() == "true"
+
+    return {
+        "mood": int(mood) if mood in ("0", "1", "2") else None,
+        "memory": memory if memory in ("special", "positive") else "none",
+        "title": str(data.get("title") or "").strip(),
+        # Names are never stored as facts, same as is_valid
+        "fact_valid": validity and fact_type.lower() != "name",
+        "fact_type": fact_type,
+        "fact_value": str(fact.get("value") or "").strip(),
+    }
+
+async def analyze_message(question: str, language: str) -> dict:
+    """Mood, special-memory and fact analysis of one message in a single model call"""
+    try:
+        result = await run_cached_analysis(
+            "message_analysis", question, language, schema="message_analysis",
+            cacheable=lambda reply: parse_message_analysis(reply)["mood"] is not None
+        )
+        return parse_message_analysis(result)
+    except Exception as e:
+        logging.error(f"Error during message analysis: {str(e)}")
+        return parse_message_analysis("")
+
+def chunk_messages(messages, token_budget: int = ANALYSIS_BATCH_TOKENS, max_size: int = ANALYSIS_BATCH_SIZE):
+    """Greedily pack messages into batches that fit the prompt token budget"""
+    batches, batch, used = [], [], 0
+    for message in messages:
+        cost = estimate_tokens(message)
+        if batch and (used + cost > token_budget or len(batch) >= max_size):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(message)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+async def analyze_message_batch(messages, language: str) -> list:
+    """Analyze several messages with one model call; results are in the same order as messages.
+
+    Messages found in the analysis cache are not sent to the model, and messages the model skipped
+    or answered unparseably are re-analyzed one at a time.
+    """
+    if len(messages) == 1:
+        return [await analyze_message(messages[0], language)]
+
+    # Batch results are cached per message under the single-message prompt's key: both prompts ask for
+    # the same fields, so a message analyzed either way is not analyzed again
+    keys = [analysis_cache_key(ANALYSIS_MODEL, PROMPT_TEMPLATES["message_analysis"], message, language,
+                               schema="message_analysis")
+            for message in messages]
+    results, pending = {}, {}  # pending: cache key -> indexes of the uncached messages with that key
+    for i, key in enumerate(keys):
+        # A lone uncached message goes through analyze_message, which counts its miss
+        cached = lookup_cached_analysis(key, count_miss=False)
+        if cached is not None:
+            results[i] = parse_message_analysis(cached)
+        else:
+            pending.setdefault(key, []).append(i)
+    unique = list(pending)
+
+    if len(unique) > 1:
+        if ANALYSIS_CACHE:
+            # Repeats of a message in the same batch are answered by its one analysis
+            analysis_cache_stats["misses"] += len(unique)
+            analysis_cache_stats["hits"] += sum(len(indexes) - 1 for indexes in pending.values())
+        numbered = "\n".join(
+            f"{n}. {' '.join(messages[pending[key][0]].split())}" for n, key in enumerate(unique, start=1)
+        )
+        try:
+            chain = await get_chain("batch_analysis", language, schema="batch_analysis")
+            raw = await run_llm(chain, {"messages": numbered})
+            data = extract_json(raw)
+            items = data.get("results", []) if isinstance(data, dict) else []
+            for item in items if isinstance(items, list) else []:
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    index = int(item.get("id"))
+                except (TypeError, ValueError):
+                    continue
+                if 1 <= index <= len(unique):
+                    analysis = normalize_message_analysis(item)
+                    for i in pending[unique[index - 1]]:
+                        results[i] = analysis
+                    if analysis["mood"] is not None:
+                        reply = {key: value for key, value in item.items() if key != "id"}
+                        store_cached_analysis(unique[index - 1], json.dumps(reply))
+        except Exception as e:
+            logging.error(f"Error during batch message analysis: {str(e)}")
+
+    missing = [i for i in range(len(messages)) if i not in results or results[i]["mood"] is None]
+    if missing and len(unique) > 1:
+        logging.warning(f"Batch analysis missed {len(missing)} of {len(messages)} messages, analyzing them individually")
+    if missing:
+        retried = await asyncio.gather(*(analyze_message(messages[i], language) for i in missing))
+        results.update(zip(missing, retried))
+    return [results[i] for i in range(len(messages))]
+
+async def download_model_background(model_name):
+    """Pull a model with Ollama, yielding formatted progress lines"""
     try:
         process = await asyncio.create_subprocess_exec(
             "ollama", "pull", model_name,
@@ -335,7 +1039,7 @@ async def download_model_background(model_name, handler):
             else:
                 formatted_output = decoded
 
-            await handler.queue.put(formatted_output + "\n")
+            yield formatted_output + "\n"
                 
         await process.wait()
         
@@ -346,7 +1050,7 @@ async def download_model_background(model_name, handler):
             logging.info("Cleared model cache after download")
             
     except Exception as e:
-        await handler.queue.put(f"Download error: {str(e)}\n")
+        yield f"Download error: {str(e)}\n"
 
 async def check_model():
     """Check available models"""
@@ -364,22 +1068,8 @@ async def check_model():
 
 async def is_valid(question: str, language: str):
     """Improved validity check with multilingual support and cached model"""
-    language_name = get_language_name(language)
-    valid_prompt = ChatPromptTemplate.from_template(f"""
-You are a memory filter AI. Analyze the user's message in {language_name}.
-Your task is to determine if the message contains any factual, personal, or goal-related information that should be stored in memory.
-Respond strictly in this format:
-validity: true/false
-type: <category like name, location, goal, preference>
-value: <summarized version of the message, clearly expressed as a fact>
-
-User message: {{question}}
-""")
     try:
-        # Use cached non-streaming model instance
-        model = await get_model_instance("gemma3n:e2b", streaming=False)
-        chain = valid_prompt | model
-        result = await asyncio.to_thread(chain.invoke, {"question": question})
+        result = await run_cached_analysis("valid", question, language)
         
         lines = str(result).strip().splitlines()
         validity = "true" in (lines[0] if lines else "").lower()
@@ -393,12 +1083,40 @@ User message: {{question}}
         logging.error(f"[is_valid error] {e}")
         return False, "", ""
 
-async def today_generate(conversation_context: str, language: str):
-    """Improved daily summary generation with multilingual support and cached model"""
+SUMMARY_CHUNK_TOKENS = 2000  # Conversation tokens per summary prompt; larger deltas are summarized map-reduce style
+SUMMARY_REDUCE_ROUNDS = 3     # Bound on note-of-notes rounds, in case the model's notes do not get shorter
+
+async def summarize_chunk(transcript: str, language: str) -> str:
+    """Map step: condense one chunk of conversation into short notes for the daily summary"""
+    chain = await get_chain("summary_notes", language)
+    result = await run_llm(chain, {"conversation_context": transcript}, priority=PRIORITY_SUMMARY)
+    return str(result).strip()
+
+async def condense_transcript(lines, language: str) -> str:
+    """Return the conversation as-is when it fits one prompt, otherwise notes reduced until they fit"""
+    for _ in range(SUMMARY_REDUCE_ROUNDS):
+        chunks = chunk_messages(lines, SUMMARY_CHUNK_TOKENS, max_size=len(lines))
+        if len(chunks) <= 1:
+            break
+        notes = await asyncio.gather(*(summarize_chunk("\n".join(chunk), language) for chunk in chunks))
+        lines = [note for note in notes if note]
+    return "\n".join(lines)
+
+async def today_generate(conversations, language: str):
+    """Fold buffer messages that are not yet in today's summary into it.
+
+    Only messages above the summary's watermark are sent, with the previous summary as context;
+    when none are new the LLM is not called at all.
+    """
     today_str = datetime.now().strftime("%Y-%m-%d")
-    language_name = get_language_name(language)
     
     try:
+        watermark = get_summary_watermark(today_str)
+        new_messages = [conv for conv in conversations if conv["id"] > watermark]
+        if not new_messages:
+            logging.info("Daily summary is up to date, skipping generation")
+            return
+
         existing_summary_data = get_today_summary(today_str)
         existing_context = ""
         if existing_summary_data:
@@ -406,47 +1124,166 @@ async def today_generate(conversation_context: str, language: str):
             existing_tips = existing_summary_data.get("tips", "")
             existing_context = f"### Summary\n{existing_summary}\n\n### Tips\n{existing_tips}"
 
-        prompt_template = ChatPromptTemplate.from_template(f"""
-You are a helpful, empathetic mental health assistant. Your task is to read the conversation in {language_name} and generate:
-
-1. A short, emotionally aware summary of the user's mental and emotional state in {language_name}.
-2. Three actionable, supportive tips in {language_name}.
-
-You must reply strictly in the following format and say nothing else:
-
-### Summary
-<Concise, emotionally intelligent summary here in {language_name}>
-
-### Tips
-- <Actionable, supportive tip 1 in {language_name}>
-- <Actionable, supportive tip 2 in {language_name}>
-- <Actionable, supportive tip 3 in {language_name}>
-
-Only return this format. Do not add explanations, prefaces, or confirmations.
+        conversation_context = await condense_transcript(
+            [f'{conv["sender"]}: {conv["message"]}' for conv in new_messages], language
+        )
 
-Context (if any): {{existing_context}}  
-Conversation: {{conversation_context}}
-""")
-        
-        # Use cached non-streaming model instance
-        model = await get_model_instance("gemma3n:e2b", streaming=False)
-        chain = prompt_template | model
-        result = await asyncio.to_thread(chain.invoke, {
+        chain = await get_chain("daily_summary", language)
+        result = await run_llm(chain, {
             "existing_context": existing_context, 
             "conversation_context": conversation_context,
-        })
+        }, priority=PRIORITY_SUMMARY)
         
-        parts = str(result).strip().split("### Tips", maxsplit=1)
-        summary_part = parts[0].replace("### Summary", "").strip() if len(parts) > 0 else ""
-        tips_part = parts[1].strip() if len(parts) > 1 else ""
-        
-        tips_part = "\n".join([line.strip().lstrip("-*• ") for line in tips_part.splitlines() if line.strip()])
-
-        upsert_today_summary(today_str, summary_part, tips_part)
+        summary_part, tips_part = parse_summary_reply(result)
+        upsert_today_summary(today_str, summary_part, tips_part, max(conv["id"] for conv in new_messages))
 
     except Exception as e:
         logging.error(f"[today_generate error] {e}")
 
+def parse_summary_reply(result):
+    """Split a '### Summary ... ### Tips ...' reply into the summary text and one tip per line"""
+    parts = str(result).strip().split("### Tips", maxsplit=1)
+    summary_part = parts[0].replace("### Summary", "").strip() if len(parts) > 0 else ""
+    tips_part = parts[1].strip() if len(parts) > 1 else ""
+    
+    tips_part = "\n".join([line.strip().lstrip("-*• ") for line in tips_part.splitlines() if line.strip()])
+    return summary_part, tips_part
+
+SUMMARY_PERIODS = ("week", "month")
+
+def summary_period_range(period: str, day):
+    """First day of the week (Monday) or month containing day, and the first day after it"""
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    start = day.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+# Roll-ups are generated at most once at a time, so repeated requests wait for the cached result
+rollup_lock = asyncio.Lock()
+
+async def rollup_generate(period: str, day, language: str):
+    """Weekly or monthly summary built from that period's daily summaries.
+
+    Cached in summary_rollups and only regenerated when the daily summaries it covers change.
+    Returns None when the period has no daily summaries.
+    """
+    start, end = summary_period_range(period, day)
+    start_str = start.strftime("%Y-%m-%d")
+    async with rollup_lock:
+        days, source_key = get_summary_sources(start_str, end.strftime("%Y-%m-%d"))
+        if not days:
+            return None
+        cached = get_summary_rollup(period, start_str)
+        if cached and (cached["source_days"], cached["source_watermark"]) == source_key:
+            return cached
+
+        chain = await get_chain("rollup", language, period=period)
+        result = await run_llm(chain, {
+            "daily_summaries": "\n".join(f'{entry["date"]}: {entry["summary"]}' for entry in days),
+        }, priority=PRIORITY_SUMMARY)
+
+        summary_part, tips_part = parse_summary_reply(result)
+        upsert_summary_rollup(period, start_str, summary_part, tips_part, source_key)
+        return get_summary_rollup(period, start_str)
+
+# --- Chat Context ---
+def build_chat_context(session: dict, memories, budget: int = None, persist: bool = True) -> dict:
+    """Session summary, recent turns and memories for the next chat message, within budget estimated tokens.
+
+    The summary (of turns up to session["summary_turn"]) always goes in, then the top-ranked memories that
+    fit CHAT_MEMORY_TOKENS, then the turns from session["history_turn"] on. When those no longer fit, the
+    oldest are dropped until the rest fills half of what is left, and the new first turn is stored: the
+    history then stays a stable prompt prefix for the next several messages instead of sliding every turn.
+    At most CHAT_HISTORY_MAX_TURNS turns are read. With persist=False the new first turn is not stored,
+    for callers that only look at the context.
+    """
+    budget = CHAT_CONTEXT_TOKENS if budget is None else budget
+    summary = session["summary"]
+    used = estimate_tokens(summary) if summary else 0
+
+    kept_memories, memory_budget = [], min(CHAT_MEMORY_TOKENS, budget - used)
+    for text in memories:
+        cost = estimate_tokens(text)
+        if cost > memory_budget:
+            break
+        kept_memories.append(text)
+        memory_budget -= cost
+        used += cost
+
+    after_turn = max(session["summary_turn"], session["history_turn"] - 1)
+    turns = get_session_history(session["session_id"], after_turn, CHAT_HISTORY_MAX_TURNS)
+    costs = [estimate_tokens(user_message) + estimate_tokens(assistant_message) for _, user_message, assistant_message in turns]
+    history_tokens, history_budget = sum(costs), budget - used
+    next_turn = turns[-1][0] + 1 if turns else None
+    if history_tokens > history_budget:
+        while turns and history_tokens > history_budget // 2:
+            history_tokens -= costs.pop(0)
+            turns.pop(0)
+    first_turn = turns[0][0] if turns else next_turn
+    if persist and first_turn is not None and first_turn != session["history_turn"]:
+        set_session_history_turn(session["session_id"], first_turn)
+    used += history_tokens
+
+    history = []
+    for _, user_message, assistant_message in turns:
+        history += [("human", user_message), ("ai", assistant_message)]
+    return {
+        "session_summary": summary,
+        "history": history,
+        "memories": "\n".join(kept_memories),
+        "turns": len(turns),
+        "estimated_tokens": used,
+    }
+
+# Sessions being summarized, so a burst of messages starts one summary per session
+sessions_summarizing = set()
+
+async def summarize_session(session_id: str) -> bool:
+    """Fold all but the newest SESSION_RECENT_TURNS unsummarized turns into the session summary.
+
+    Long spans are condensed map-reduce style first, like the daily summary. Returns False when there
+    was nothing to fold.
+    """
+    session = get_chat_session(session_id)
+    if session is None:
+        return False
+    turns = get_session_history(session_id, session["summary_turn"], max_turns=None)
+    older = turns[:-SESSION_RECENT_TURNS] if SESSION_RECENT_TURNS else turns
+    if not older:
+        return False
+
+    language = session["language"] or get_default_language()
+    lines = [f"user: {user_message}\nassistant: {assistant_message}" for _, user_message, assistant_message in older]
+    conversation = await condense_transcript(lines, language)
+    chain = await get_chain("session_summary", language)
+    result = await run_llm(chain, {
+        "summary": session["summary"] or "(none yet)",
+        "conversation": conversation,
+        "max_words": SESSION_SUMMARY_WORDS,
+    }, priority=PRIORITY_SUMMARY)
+    set_session_summary(session_id, str(result).strip(), older[-1][0])
+    logging.info(f"Summarized turns up to {older[-1][0]} of session {session_id}")
+    return True
+
+async def maybe_summarize_session(session_id: str):
+    """Background step after each chat turn: summarize once the unsummarized turns pass the trigger size"""
+    if session_id in sessions_summarizing:
+        return
+    sessions_summarizing.add(session_id)
+    try:
+        session = get_chat_session(session_id)
+        if session is None:
+            return
+        turns = get_session_history(session_id, session["summary_turn"], max_turns=None)
+        tokens = sum(estimate_tokens(user_message) + estimate_tokens(assistant_message) for _, user_message, assistant_message in turns)
+        if tokens > SESSION_SUMMARY_TRIGGER_TOKENS:
+            await summarize_session(session_id)
+    except Exception as e:
+        logging.error(f"Error summarizing session {session_id}: {e}")
+    finally:
+        sessions_summarizing.discard(session_id)
+
 # --- API Endpoints ---
 
 @app.post("/stream")
@@ -458,52 +1295,53 @@ async def query_stream(request: Request):
     if not parsed.language:
         parsed.language = detect_language(parsed.question)
     
-    language_name = get_language_name(parsed.language)
-    
-    handler = CustomHandler()
-    
-    # Use cached streaming model instance with handler
-    model = await get_model_instance(parsed.model, streaming=True, callbacks=[handler])
-    chain = prompt | model
-
-    async def run_chain_and_save():
+    async def chat_stream():
+        reply = []
         try:
-            special_memories = get_relevant_special_memories(parsed.question)
-            
-            context = f"User's Name: {parsed.userName}\n{parsed.context}"
-            context += "\n".join([mem['memory'] for mem in special_memories])
-            
-            await asyncio.to_thread(chain.invoke, {
-                "context": context,
-                "question": parsed.question,
-                "language": parsed.language,
-                "language_name": language_name
-            })
-
-            # Save to buffer
-            add_to_buffer(sender='user', message=parsed.question)
-            add_to_buffer(sender='assistant', message=handler.buffer)
-                
+            special_memories = await retrieve_special_memories(parsed.question)
+
+            session = upsert_chat_session(parsed.session_id, parsed.userName, parsed.language, parsed.context)
+            context = build_chat_context(session, [mem['memory'] for mem in special_memories])
+
+            # Shared cached model; astream drives Ollama's async streaming API on the event loop
+            chain = await get_chain("chat", parsed.language, parsed.model, streaming=True, chat=True)
+            async with scheduler.slot(parsed.model, PRIORITY_CHAT):
+                chunks = chain.astream({
+                    "user_name": session["user_name"] or "User",
+                    "session_context": session["context"],
+                    "session_summary": context["session_summary"],
+                    "history": context["history"],
+                    "memories": context["memories"],
+                    "question": parsed.question,
+                })
+                tokens = message_tokens(chunks, lambda info: record_prompt_eval(parsed.model, info))
+                async for chunk in coalesce_tokens(tokens, parsed.flush_ms, parsed.flush_bytes):
+                    reply.append(chunk)
+                    yield sse_frame(chunk)
+
         except Exception as e:
-            logging.error(f"Chain invoke error: {str(e)}")
+            logging.error(f"Chain stream error: {str(e)}")
 
             model_list = await check_model()
             model_names = [line.split()[0].lower() for line in model_list.splitlines()[1:] if line.strip()]
-            
+
             if parsed.model.lower() not in model_names:
-                await handler.queue.put("Model not found locally. Downloading the model, please wait...")
-                await download_model_background(parsed.model, handler)
+                yield sse_frame("Model not found locally. Downloading the model, please wait...")
+                async for line in download_model_background(parsed.model):
+                    yield sse_frame(line)
             else:
-                await handler.queue.put(f"Error: {str(e)}")
-        
+                yield sse_frame(f"Error: {str(e)}")
+
         finally:
-            await handler.queue.put("[END]")
+            # Save to buffer (also when the client disconnects mid-reply)
+            if reply:
+                add_turn_to_buffer(parsed.question, "".join(reply), parsed.session_id)
+                if SESSION_SUMMARIES:
+                    asyncio.create_task(maybe_summarize_session(parsed.session_id))
 
-    asyncio.create_task(run_chain_and_save())
-    
     # Return SSE stream instead of plain text
     return StreamingResponse(
-        handler.token_stream(), 
+        chat_stream(),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -512,11 +1350,19 @@ async def query_stream(request: Request):
         }
     )
 
+# The UI triggers processing from several screens; runs take turns so no message is analyzed twice
+buffer_processing_lock = asyncio.Lock()
+
 @app.post("/process_conversations")
 async def process_conversations():
     """Process conversations using the default language setting"""
+    async with buffer_processing_lock:
+        return await process_buffer_snapshot()
+
+async def process_buffer_snapshot():
+    """Claim the unread buffer up to its current last message, analyze it and ack exactly those messages"""
     try:
-        conversations = get_unread_buffer()
+        watermark, conversations = claim_unread_buffer()
 
         if not conversations:
             return JSONResponse(content={"message": "Buffer is empty."}, status_code=200)
@@ -525,38 +1371,25 @@ async def process_conversations():
         default_lang = get_default_language()
         language_name = get_language_name(default_lang)
         
-        user_messages = [conv for conv in conversations if conv.get("sender") == "user"]
-        message_ids_to_delete = [conv["id"] for conv in conversations]
-
-        # Process each user message with default language
-        tasks = []
-        for conv in user_messages:
-            question = conv.get("message")
-            if not question:
-                continue
-            
-            # Use default language for all analysis
-            tasks.extend([
-                analyze_and_log_mood(question, default_lang),
-                process_message_positivity(question, default_lang)
-            ])
+        questions = [
+            conv["message"]
+            for conv in conversations
+            if conv["sender"] == "user" and conv["message"].strip()
+        ]
 
-        # Run all analysis tasks concurrently
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        # Use default language for all analysis
+        await analyze_buffered_messages(questions, default_lang)
 
-        # Generate daily summary with default language
-        if conversations:
-            conversation_context = "\n".join([f'{conv["sender"]}: {conv["message"]}' for conv in conversations])
-            await today_generate(conversation_context, default_lang)
+        # Fold the new messages into the daily summary with default language
+        await today_generate(conversations, default_lang)
 
-        # Delete processed messages
-        if message_ids_to_delete:
-            delete_processed_buffer(message_ids_to_delete)
+        # Messages that arrived while processing are above the watermark and stay unread
+        ack_buffer(watermark)
+        evict_analysis_cache_now()
 
         return JSONResponse(
             content={
-                "message": f"Successfully processed {len(user_messages)} user messages in {language_name}."
+                "message": f"Successfully processed {len(questions)} user messages in {language_name}."
             }
         )
 
@@ -564,6 +1397,56 @@ async def process_conversations():
         logging.error(f"Error processing buffer: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+async def analyze_buffered_messages(questions, language: str):
+    """Run mood and memory analysis for all buffered user messages"""
+    if not COMBINED_ANALYSIS:
+        await asyncio.gather(*(process_message(question, language) for question in questions), return_exceptions=True)
+        return
+
+    async def process_batch(batch):
+        try:
+            analyses = await analyze_message_batch(batch, language)
+            for question, analysis in zip(batch, analyses):
+                await apply_message_analysis(question, analysis, language)
+        except Exception as e:
+            logging.error(f"Error processing message batch: {e}")
+
+    await asyncio.gather(*(process_batch(batch) for batch in chunk_messages(questions)))
+
+async def process_message(question: str, language: str):
+    """Run mood and memory analysis for one buffered user message"""
+    if not COMBINED_ANALYSIS:
+        await asyncio.gather(
+            analyze_and_log_mood(question, language),
+            process_message_positivity(question, language)
+        )
+        return
+
+    try:
+        analysis = await analyze_message(question, language)
+        await apply_message_analysis(question, analysis, language)
+    except Exception as e:
+        logging.error(f"Error processing message: {e}")
+
+async def apply_message_analysis(question: str, analysis: dict, language: str):
+    """Log the mood and store the special memory found by message analysis"""
+    try:
+        if analysis["mood"] is not None:
+            await log_mood(analysis["mood"])
+            logging.info(f"Mood logged: {analysis['mood']} for language: {get_language_name(language)}")
+        else:
+            logging.warning("Invalid mood result from message analysis")
+        if analysis["memory"] == "special":
+            await save_special_memory(question, analysis["title"])
+    except Exception as e:
+        logging.error(f"Error applying message analysis: {e}")
+
+async def save_special_memory(question: str, title: str):
+    """Store a special memory and add it to the vector index when semantic retrieval is on"""
+    memory_id = add_special_memory(question, title.title())
+    if memory_id and SEMANTIC_MEMORY:
+        await semantic_memory.index_memories([(memory_id, question)], EMBEDDING_MODEL)
+
 async def process_message_positivity(question: str, language: str):
     """Helper function to process message positivity with cached model"""
     try:
@@ -572,8 +1455,7 @@ async def process_message_positivity(question: str, language: str):
         
         if result.startswith("special:"):
             title = result.split(":", 1)[1].strip()
-            title = title.title()
-            add_special_memory(question, title)
+            await save_special_memory(question, title)
     except Exception as e:
         logging.error(f"Error processing message positivity: {e}")
 
@@ -584,19 +1466,70 @@ async def post_mood_data_json(data: MoodRequest):
     await log_mood(data.graph)
     return {"mood": data.graph}
 
+MOOD_PAGE_LIMIT = 200      # Entries per page when the client does not pass a limit
+MOOD_PAGE_MAX_LIMIT = 1000
+
+def stream_mood_entries(entries, limit: int = None):
+    """Encode mood entries as JSON while they are read: a plain list, or a page object when limit is set"""
+    yield "[" if limit is None else '{"entries": ['
+    next_cursor = None
+    try:
+        for i, entry in enumerate(entries):
+            if limit is not None and i == limit:
+                # One extra row was read only to know whether an older page exists
+                next_cursor = f"{last['timestamp']}|{last['id']}"
+                break
+            last = entry
+            item = {"mood": entry["mood"], "timestamp": entry["timestamp"]}
+            if limit is not None:
+                item["id"] = entry["id"]
+            yield ("," if i else "") + json.dumps(item)
+    except Exception as e:
+        logging.error(f"Error reading mood log: {e}")
+    yield "]" if limit is None else f"], \"next_cursor\": {json.dumps(next_cursor)}}}"
+
 @app.get("/mood")
-async def get_mood_graph_value():
+async def get_mood_graph_value(since: str = None, until: str = None, limit: int = None, cursor: str = None):
+    """Full mood log, oldest first. With since/until/limit/cursor, one page of entries newest first
+    plus the cursor for the next (older) page; since is inclusive, until exclusive."""
+    if since is None and until is None and limit is None and cursor is None:
+        return StreamingResponse(stream_mood_entries(iter_mood_log()), media_type="application/json")
+
+    after = None
+    if cursor:
+        timestamp, _, entry_id = cursor.rpartition("|")
+        try:
+            datetime.fromisoformat(timestamp)
+        except ValueError:
+            timestamp = None
+        if not timestamp or not entry_id.isdigit():
+            return JSONResponse(content={"error": "Invalid cursor"}, status_code=400)
+        after = (timestamp, int(entry_id))
+    limit = min(max(1, limit or MOOD_PAGE_LIMIT), MOOD_PAGE_MAX_LIMIT)
+    entries = iter_mood_log(since, until, after=after, newest_first=True, limit=limit + 1)
+    return StreamingResponse(stream_mood_entries(entries, limit), media_type="application/json")
+
+@app.get("/mood/stats")
+async def get_mood_stats(bucket: str = "day", since: str = None, until: str = None, window: int = 7):
+    """Mood counts per hour/day/week/month with average and rolling average scores; since is inclusive and
+    until exclusive, as in GET /mood"""
+    if bucket not in MOOD_BUCKETS:
+        return JSONResponse(content={"error": f"bucket must be one of {', '.join(MOOD_BUCKETS)}"}, status_code=400)
     try:
-        with open("mood_log.json", "r", encoding='utf-8') as f:
-            return JSONResponse(content=json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return JSONResponse(content=[])
+        periods = get_mood_rollups(bucket, since, until)
+        return JSONResponse(content={
+            "bucket": bucket,
+            "moods": sorted(MOOD_SCORES),  # order of the per-period counts
+            "periods": summarize_mood_periods(periods, max(1, window), bucket),
+        })
+    except Exception as e:
+        logging.error(f"Error reading mood stats: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
 
 @app.delete("/mood")
-async def clear_mood_log():
+async def clear_mood_log_endpoint():
     try:
-        with open("mood_log.json", "w", encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False)
+        clear_mood_log()
         return JSONResponse(content={"message": "Mood log cleared successfully"}, status_code=200)
     except Exception as e:
         logging.error(f"Error clearing mood log: {e}")
@@ -610,6 +1543,8 @@ async def get_special_memory():
 async def update_special_memory_endpoint(request: SpecialMemoryUpdateRequest):
     try:
         update_special_memory(request.id, request.title, request.memory)
+        if SEMANTIC_MEMORY:
+            await semantic_memory.index_memories([(request.id, request.memory)], EMBEDDING_MODEL)
         return JSONResponse(content={"message": "Special memory updated successfully"}, status_code=200)
     except Exception as e:
         logging.error(f"Error updating special memory: {e}")
@@ -620,6 +1555,7 @@ async def delete_memory_endpoint(request: MemoryDeleteRequest):
     try:
         if request.table == "special_memories":
             delete_special_memory(request.id)
+            semantic_memory.remove_memories([request.id], EMBEDDING_MODEL)
         else:
             return JSONResponse(content={"error": "Invalid table specified"}, status_code=400)
         return JSONResponse(content={"message": "Memory deleted successfully"}, status_code=200)
@@ -635,48 +1571,265 @@ async def get_mood_summary():
         return JSONResponse(content=[summary_data])
     return JSONResponse(content=[])
 
-@app.get("/export_data")
-async def export_data():
+@app.get("/storage_stats")
+async def get_storage_stats_endpoint():
+    """Database size, reclaimable pages, per-table sizes and the last buffer compaction"""
     try:
-        db_path = os.path.join(os.path.dirname(__file__), "memory.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        all_data = io.StringIO()
-        tables = ["special_memories", "conversation_buffer", "daily_summaries"]
-
-        for table_name in tables:
-            cursor.execute(f"SELECT * FROM {table_name}")
-            rows = cursor.fetchall()
-            column_names = [description[0] for description in cursor.description]
-
-            if rows:
-                all_data.write(f"Table: {table_name}\n")
-                df = pd.DataFrame(rows, columns=column_names)
-                df.to_csv(all_data, index=False)
-                all_data.write("\n\n")
-        
-        conn.close()
-        all_data.seek(0)
-
-        return StreamingResponse(
-            io.BytesIO(all_data.getvalue().encode("utf-8")),
-            media_type="text/csv; charset=utf-8",
-            headers={
-                "Content-Disposition": "attachment; filename=memory_export.csv"
-            }
-        )
+        stats = await asyncio.to_thread(get_storage_stats)
+        stats["retention"] = {"days": BUFFER_RETENTION_DAYS, "rows": BUFFER_RETENTION_ROWS}
+        stats["last_compaction"] = last_compaction
+        return JSONResponse(content=stats)
+    except Exception as e:
+        logging.error(f"Error reading storage stats: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.post("/compact_buffer")
+async def compact_buffer_endpoint():
+    """Run buffer compaction now instead of waiting for the background task"""
+    try:
+        return JSONResponse(content=await compact_buffer_now())
+    except Exception as e:
+        logging.error(f"Error compacting conversation buffer: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+SESSION_PAGE_LIMIT = 50
+
+@app.get("/sessions")
+async def get_sessions_endpoint(limit: int = None):
+    """Chat sessions, most recently used first"""
+    try:
+        return JSONResponse(content={"sessions": list_chat_sessions(min(max(1, limit or SESSION_PAGE_LIMIT), 1000))})
+    except Exception as e:
+        logging.error(f"Error listing sessions: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.get("/sessions/{session_id}")
+async def get_session_endpoint(session_id: str):
+    """A session's settings, summary and the context the next message would be sent with"""
+    try:
+        session = get_chat_session(session_id)
+        if session is None:
+            return JSONResponse(content={"error": "Session not found"}, status_code=404)
+        context = build_chat_context(session, [], persist=False)  # viewing must not move the chat window
+        return JSONResponse(content={
+            **session,
+            "history": [{"role": role, "message": message} for role, message in context["history"]],
+            "context_tokens": context["estimated_tokens"],
+            "context_budget": CHAT_CONTEXT_TOKENS,
+        })
+    except Exception as e:
+        logging.error(f"Error reading session {session_id}: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+SUMMARY_PAGE_LIMIT = 30
+SUMMARY_PAGE_MAX_LIMIT = 366
+
+@app.get("/summaries")
+async def get_summaries_endpoint(since: str = None, until: str = None, limit: int = None, cursor: str = None):
+    """Daily summaries newest first, filtered by date (since inclusive, until exclusive, YYYY-MM-DD),
+    with next_cursor for the next (older) page"""
+    try:
+        limit = min(max(1, limit or SUMMARY_PAGE_LIMIT), SUMMARY_PAGE_MAX_LIMIT)
+        rows = get_summaries(since, until, before=cursor, limit=limit + 1)
+        next_cursor = rows[limit - 1]["date"] if len(rows) > limit else None
+        return JSONResponse(content={"summaries": rows[:limit], "next_cursor": next_cursor})
+    except Exception as e:
+        logging.error(f"Error reading summaries: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.get("/summaries/{period}")
+async def get_summary_rollup_endpoint(period: str, date: str = None):
+    """Weekly or monthly summary of the period containing date (default today), generated on first request"""
+    if period not in SUMMARY_PERIODS:
+        return JSONResponse(content={"error": f"period must be one of {', '.join(SUMMARY_PERIODS)}"}, status_code=400)
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date() if date else datetime.now().date()
+    except ValueError:
+        return JSONResponse(content={"error": "date must be YYYY-MM-DD"}, status_code=400)
+    try:
+        rollup = await rollup_generate(period, day, get_default_language())
+        if rollup is None:
+            return JSONResponse(content={"error": f"No daily summaries in this {period}"}, status_code=404)
+        return JSONResponse(content={
+            "period": rollup["period"],
+            "start_date": rollup["start_date"],
+            "summary": rollup["summary"],
+            "tips": rollup["tips"],
+            "days": rollup["source_days"],
+            "generated_at": rollup["created_at"],
+        })
+    except Exception as e:
+        logging.error(f"Error generating {period} summary: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
 
+@app.get("/models/state")
+async def get_models_state():
+    """Load state of the chat and analysis models, so the UI can show readiness before the first reply"""
+    loaded = await loaded_models()
+    models = []
+    for model_name, roles in model_roles().items():
+        tracked = model_states.get(model_name, {})
+        ollama_name = model_name if ":" in model_name else f"{model_name}:latest"
+        if loaded and ollama_name in loaded:
+            state = "loaded"
+        elif tracked.get("state") in ("loading", "missing", "error"):
+            state = tracked["state"]
+        else:
+            state = "not_loaded"  # Never warmed up, or unloaded by Ollama after keep_alive expired
+        models.append({
+            "model": model_name,
+            "roles": roles,
+            "keep_alive": {role: KEEP_ALIVE[role] for role in roles},
+            "effective_keep_alive": model_keep_alive(model_name),
+            "state": state,
+            "expires_at": loaded[ollama_name]["expires_at"] if state == "loaded" else None,
+            "load_ms": tracked.get("load_ms"),
+            "error": tracked.get("error"),
+        })
+    return JSONResponse(content={
+        "ollama_running": loaded is not None,
+        "ready": all(model["state"] == "loaded" for model in models),
+        "models": models,
+    })
+
+@app.post("/models/warmup")
+async def warm_up_models_endpoint():
+    """Load the configured models in the background, e.g. after the chat model or keep_alive changed"""
+    asyncio.create_task(warm_up_models())
+    return JSONResponse(content={"message": "Model warm-up started"}, status_code=202)
+
+@app.get("/llm_metrics")
+async def get_llm_metrics():
+    """In-flight requests, queue depth and wait times of the LLM scheduler per model and priority,
+    and prompt tokens evaluated per recent chat turn"""
+    metrics = scheduler.metrics()
+    for model_name in chat_prompt_evals:
+        metrics.setdefault(model_name, {})["chat_prompt_eval"] = prompt_eval_metrics(model_name)
+    return JSONResponse(content=metrics)
+
+@app.get("/analysis_cache")
+async def get_analysis_cache_stats():
+    """Hit rate of the analysis cache since startup, its size and limits"""
+    try:
+        lookups = analysis_cache_stats["hits"] + analysis_cache_stats["misses"]
+        return JSONResponse(content={
+            **analysis_cache_stats,
+            "hit_rate": round(analysis_cache_stats["hits"] / lookups, 4) if lookups else None,
+            "entries": count_cached_analyses(),
+            "enabled": ANALYSIS_CACHE,
+            "ttl_days": ANALYSIS_CACHE_TTL_DAYS,
+            "max_entries": ANALYSIS_CACHE_MAX_ENTRIES,
+        })
     except Exception as e:
-        logging.error(f"Error exporting data: {e}")
+        logging.error(f"Error reading analysis cache stats: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+@app.delete("/analysis_cache")
+async def clear_analysis_cache_endpoint():
+    """Forget all cached analysis replies, e.g. after editing a prompt by hand"""
+    try:
+        clear_analysis_cache()
+        return JSONResponse(content={"message": "Analysis cache cleared"}, status_code=200)
+    except Exception as e:
+        logging.error(f"Error clearing analysis cache: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "memory_export.csv"),
+    "ndjson": ("application/x-ndjson", "memory_export.ndjson"),
+    "zip": ("application/zip", "memory_export.zip"),
+}
+
+def export_csv_table(table: str):
+    """CSV text of one table in batches, starting with its column header; nothing for an empty table"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    header_written = False
+    for columns, rows in iter_table_batches(table):
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+def export_csv():
+    """All tables as one CSV document: each non-empty table under its own 'Table:' heading"""
+    for table in EXPORT_TABLES:
+        started = False
+        for text in export_csv_table(table):
+            if not started:
+                yield f"Table: {table}\n".encode("utf-8")
+                started = True
+            yield text.encode("utf-8")
+        if started:
+            yield b"\n\n"
+
+def export_ndjson():
+    """One JSON object per row, tagged with its table"""
+    for table in EXPORT_TABLES:
+        for columns, rows in iter_table_batches(table):
+            lines = (json.dumps({"table": table, **dict(zip(columns, row))}, ensure_ascii=False) for row in rows)
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, unseekable sink that zipfile writes into and the export generator drains"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_zip():
+    """A zip archive holding one CSV file per table, compressed and sent as it is built"""
+    sink = _StreamBuffer()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for table in EXPORT_TABLES:
+            with archive.open(f"{table}.csv", "w", force_zip64=True) as member:
+                for text in export_csv_table(table):
+                    member.write(text.encode("utf-8"))
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+@app.get("/export_data")
+async def export_data(format: str = "csv"):
+    """Export all user data as CSV (default), NDJSON or a zip of per-table CSV files, streamed in batches"""
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(content={"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}, status_code=400)
+    media_type, filename = EXPORT_FORMATS[format]
+    exporters = {"csv": export_csv, "ndjson": export_ndjson, "zip": export_zip}
+    return StreamingResponse(
+        exporters[format](),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
+
 @app.delete("/clear_data")
 async def clear_data():
     try:
         db_path = os.path.join(os.path.dirname(__file__), "memory.db")
         if os.path.exists(db_path):
-            os.remove(db_path)
+            # Pooled connections hold the file (and its WAL) open, release them first
+            close_all_connections()
+            for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+            init_db()
+            semantic_memory.get_index(EMBEDDING_MODEL).clear()
             return JSONResponse(content={"message": "All data cleared successfully"}, status_code=200)
         else:
             return JSONResponse(content={"message": "Database file not found"}, status_code=404)
@@ -695,17 +1848,17 @@ async def view_buffer():
                 status_code=200
             )
         
-        formatted_buffer = []
+        # Group the per-message rows by sender
+        grouped = {}
         for entry in buffer_contents:
-            formatted_buffer.append({
-                "id": entry["id"],
-                "sender": entry["sender"],
-                "message": entry["message"].split("\n---\n")  # Split into individual messages
-            })
+            if entry["sender"] not in grouped:
+                grouped[entry["sender"]] = {"id": entry["id"], "sender": entry["sender"], "message": []}
+            grouped[entry["sender"]]["message"].append(entry["message"])
+        formatted_buffer = list(grouped.values())
             
         return JSONResponse(
             content={
-                "message": f"Found {len(buffer_contents)} entries in buffer",
+                "message": f"Found {len(formatted_buffer)} entries in buffer",
                 "data": formatted_buffer
             },
             status_code=200
@@ -729,11 +1882,44 @@ async def update_settings(request: Request):
     """Update user settings"""
     try:
         data = await request.json()
-        global DEFAULT_LANGUAGE
-        DEFAULT_LANGUAGE = data.get('defaultlang', 'en')
-        
+        global DEFAULT_LANGUAGE, SEMANTIC_MEMORY, EMBEDDING_MODEL, COMBINED_ANALYSIS
+        global BUFFER_RETENTION_DAYS, BUFFER_RETENTION_ROWS, CHAT_MODEL, WARMUP_MODELS
+        global ANALYSIS_CACHE, ANALYSIS_CACHE_TTL_DAYS, ANALYSIS_CACHE_MAX_ENTRIES, CHAT_CONTEXT_TOKENS, SESSION_SUMMARIES
+        DEFAULT_LANGUAGE = data.get('defaultlang', DEFAULT_LANGUAGE)
+        COMBINED_ANALYSIS = bool(data.get('combined_analysis', COMBINED_ANALYSIS))
+        BUFFER_RETENTION_DAYS = max(0, int(data.get('buffer_retention_days', BUFFER_RETENTION_DAYS)))
+        BUFFER_RETENTION_ROWS = max(0, int(data.get('buffer_retention_rows', BUFFER_RETENTION_ROWS)))
+        previous_chat_model = CHAT_MODEL
+        CHAT_MODEL = data.get('chat_model', CHAT_MODEL)
+        WARMUP_MODELS = bool(data.get('warmup_models', WARMUP_MODELS))
+        ANALYSIS_CACHE = bool(data.get('analysis_cache', ANALYSIS_CACHE))
+        ANALYSIS_CACHE_TTL_DAYS = max(0, int(data.get('analysis_cache_ttl_days', ANALYSIS_CACHE_TTL_DAYS)))
+        ANALYSIS_CACHE_MAX_ENTRIES = max(0, int(data.get('analysis_cache_max_entries', ANALYSIS_CACHE_MAX_ENTRIES)))
+        CHAT_CONTEXT_TOKENS = max(0, int(data.get('chat_context_tokens', CHAT_CONTEXT_TOKENS)))
+        SESSION_SUMMARIES = bool(data.get('session_summaries', SESSION_SUMMARIES))
+        if 'llm_max_in_flight' in data:
+            apply_llm_max_in_flight(data['llm_max_in_flight'])
+
+        new_keep_alive = {
+            'chat': data.get('keep_alive_chat', KEEP_ALIVE['chat']),
+            'analysis': data.get('keep_alive_analysis', KEEP_ALIVE['analysis']),
+        }
+        if new_keep_alive != KEEP_ALIVE or CHAT_MODEL != previous_chat_model:
+            KEEP_ALIVE.update(new_keep_alive)
+            # Cached instances carry the old keep_alive, which also depends on which roles share a model
+            async with _model_lock:
+                _model_instances.clear()
+
+        enable_semantic = bool(data.get('semantic_memory', SEMANTIC_MEMORY))
+        new_embedding_model = data.get('embedding_model', EMBEDDING_MODEL)
+        needs_sync = enable_semantic and (not SEMANTIC_MEMORY or new_embedding_model != EMBEDDING_MODEL)
+        SEMANTIC_MEMORY = enable_semantic
+        EMBEDDING_MODEL = new_embedding_model
+        if needs_sync:
+            asyncio.create_task(sync_semantic_index())
+
         # Save settings to file
-        save_settings({'defaultlang': DEFAULT_LANGUAGE})
+        save_settings(current_settings())
         
         return JSONResponse(
             content={"message": "Settings updated successfully"},
@@ -1,173 +1,840 @@
 import sqlite3
 import json
 import os
-from datetime import datetime
+import re
+import logging
+from datetime import datetime, timedelta
+
+from db import get_connection, transaction
 
 MEMORY_DB = "memory.db"
+LEGACY_MOOD_LOG = "mood_log.json"  # Mood entries were kept here before the mood_log table
+MOOD_READ_BATCH = 500  # Rows fetched per query when streaming the mood log
+DEFAULT_SESSION_ID = "default"  # Conversation buffer session used when the client does not name one
+LEGACY_BUFFER_SEPARATOR = "\n---\n"  # Joined a sender's messages in one buffer row before one-row-per-message
+
+# Processed buffer rows are kept for this long / up to this many rows, whichever keeps fewer
+BUFFER_RETENTION_DAYS = 30
+BUFFER_RETENTION_ROWS = 10000
+COMPACTION_BATCH_SIZE = 500  # Rows deleted per transaction, so chat writes are never blocked for long
+
+# User data included in exports; each table has an integer id to page through
+EXPORT_TABLES = ("special_memories", "conversation_buffer", "daily_summaries", "mood_log", "chat_sessions")
+EXPORT_BATCH_SIZE = 500
+
+# SQL expressions mapping a mood timestamp to its rollup period key (weeks start on Monday)
+MOOD_BUCKETS = {
+    "hour": "strftime('%Y-%m-%dT%H', {ts})",
+    "day": "date({ts})",
+    "week": "date({ts}, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m', {ts})",
+}
+# Start of the period containing a timestamp, as a date or datetime
+MOOD_BUCKET_STARTS = {
+    "hour": "strftime('%Y-%m-%d %H:00:00', {ts})",
+    "day": "date({ts})",
+    "week": "date({ts}, 'weekday 0', '-6 days')",
+    "month": "date({ts}, 'start of month')",
+}
+
+# Cached analysis replies older than this are ignored; beyond the entry limit the least recently used are evicted
+ANALYSIS_CACHE_TTL_DAYS = 30
+ANALYSIS_CACHE_MAX_ENTRIES = 5000
+
+# Query terms present in more than this fraction of memories are ignored during search
+COMMON_TERM_RATIO = 0.2
+COMMON_TERM_MIN_DOCS = 200
+
+# Set by init_db(); False when this SQLite build lacks FTS5 and keyword LIKE matching is used instead
+FTS_ENABLED = False
 
 def init_db():
     """Initializes the database with all required tables."""
-    conn = sqlite3.connect(MEMORY_DB)
-    cursor = conn.cursor()
-    
-    # --- Memory Tables ---
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS special_memories (
-            id INTEGER PRIMARY KEY,
-            title TEXT NOT NULL,
-            memory TEXT NOT NULL UNIQUE,
-            timestamp TEXT NOT NULL
+    enable_incremental_vacuum()
+    with transaction(MEMORY_DB) as conn:
+        cursor = conn.cursor()
+
+        # --- Memory Tables ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS special_memories (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                memory TEXT NOT NULL UNIQUE,
+                timestamp TEXT NOT NULL
+            )
+        ''')
+
+        # --- Conversation Buffer Table ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_buffer (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                sender TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'unread',
+                session_id TEXT NOT NULL DEFAULT 'default',
+                turn INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        migrate_conversation_buffer(cursor)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversation_buffer_session_turn ON conversation_buffer(session_id, turn)")
+        # Only unread rows are indexed, so claims and acks never scan the processed history
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversation_buffer_unread ON conversation_buffer(id) WHERE status = 'unread'")
+
+        # --- Chat Sessions Table (turns themselves are in conversation_buffer) ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL UNIQUE,
+                user_name TEXT NOT NULL DEFAULT '',
+                language TEXT NOT NULL DEFAULT '',
+                context TEXT NOT NULL DEFAULT '',
+                summary TEXT NOT NULL DEFAULT '',
+                summary_turn INTEGER NOT NULL DEFAULT -1,
+                history_turn INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+
+        # --- Daily Summaries Table ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_summaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL UNIQUE,
+                summary TEXT NOT NULL,
+                tips TEXT NOT NULL,
+                last_message_id INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # Databases created before summaries tracked the buffer messages folded into them
+        if "last_message_id" not in {row[1] for row in cursor.execute("PRAGMA table_info(daily_summaries)")}:
+            cursor.execute("ALTER TABLE daily_summaries ADD COLUMN last_message_id INTEGER NOT NULL DEFAULT 0")
+
+        # --- Weekly/Monthly Summary Cache ---
+        # source_days/source_watermark record which daily summaries a roll-up was built from
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS summary_rollups (
+                period TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                tips TEXT NOT NULL,
+                source_days INTEGER NOT NULL,
+                source_watermark INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (period, start_date)
+            ) WITHOUT ROWID
+        ''')
+
+        # --- Mood Log Table (append-only) ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mood_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                mood INTEGER NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_mood_log_timestamp ON mood_log(timestamp)")
+
+        # --- Analysis Cache (model replies keyed by a hash of model, prompt and input) ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                last_used_at TEXT NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used ON analysis_cache(last_used_at)")
+
+    init_mood_rollups()
+    init_memory_search()
+    import_legacy_mood_log()
+
+def enable_incremental_vacuum():
+    """Switches the database to incremental auto-vacuum so freed pages can be returned to the OS.
+
+    The mode only takes effect after a full VACUUM, which runs once (instantly on a new file).
+    """
+    conn = get_connection(MEMORY_DB)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+def migrate_conversation_buffer(cursor):
+    """Splits buffer rows that hold several separator-joined messages into one row per message.
+
+    Older databases kept one row per sender and appended each new message to it. Parts keep
+    their row's status and timestamp; the n-th user and assistant messages form turn n.
+    """
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(conversation_buffer)")}
+    if "turn" in columns:
+        return
+    # ALTER TABLE would otherwise commit on its own, and a failed split would leave the new columns behind
+    # with the rows never split; one transaction adds the columns and splits the rows together
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN")
+    cursor.execute(f"ALTER TABLE conversation_buffer ADD COLUMN session_id TEXT NOT NULL DEFAULT '{DEFAULT_SESSION_ID}'")
+    cursor.execute("ALTER TABLE conversation_buffer ADD COLUMN turn INTEGER NOT NULL DEFAULT 0")
+
+    next_turn = {}
+    rows = cursor.execute("SELECT id, timestamp, sender, message, status FROM conversation_buffer ORDER BY id").fetchall()
+    for row_id, timestamp, sender, message, status in rows:
+        parts = [part for part in message.split(LEGACY_BUFFER_SEPARATOR) if part.strip()] or [message]
+        turn = next_turn.get(sender, 0)
+        next_turn[sender] = turn + len(parts)
+        cursor.execute("UPDATE conversation_buffer SET message = ?, turn = ? WHERE id = ?", (parts[0], turn, row_id))
+        cursor.executemany(
+            "INSERT INTO conversation_buffer (timestamp, sender, message, status, session_id, turn) VALUES (?, ?, ?, ?, ?, ?)",
+            [(timestamp, sender, part, status, DEFAULT_SESSION_ID, turn + offset) for offset, part in enumerate(parts[1:], 1)]
         )
-    ''')
-
-    # --- Conversation Buffer Table ---
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS conversation_buffer (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            sender TEXT NOT NULL,
-            message TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'unread'
+    logging.info(f"Migrated {len(rows)} conversation buffer rows to one row per message")
+
+def init_mood_rollups():
+    """Creates per-bucket mood counts that triggers keep current as mood_log changes.
+
+    Existing mood entries are rolled up once when the table is first created.
+    """
+    with transaction(MEMORY_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'mood_rollups'")
+        needs_backfill = cursor.fetchone() is None
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mood_rollups (
+                bucket TEXT NOT NULL,
+                period TEXT NOT NULL,
+                mood INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (bucket, period, mood)
+            ) WITHOUT ROWID
+        ''')
+
+        increments = "\n".join(
+            f"INSERT INTO mood_rollups (bucket, period, mood, count) VALUES ('{bucket}', {expr.format(ts='new.timestamp')}, new.mood, 1) "
+            "ON CONFLICT (bucket, period, mood) DO UPDATE SET count = count + 1;"
+            for bucket, expr in MOOD_BUCKETS.items()
         )
-    ''')
-
-    # --- Daily Summaries Table ---
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS daily_summaries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL UNIQUE,
-            summary TEXT NOT NULL,
-            tips TEXT NOT NULL
+        decrements = "\n".join(
+            f"UPDATE mood_rollups SET count = count - 1 WHERE bucket = '{bucket}' AND period = {expr.format(ts='old.timestamp')} AND mood = old.mood;"
+            for bucket, expr in MOOD_BUCKETS.items()
         )
-    ''')
+        # Timestamps SQLite cannot parse have no period and are left out of the rollups. The insert trigger
+        # is recreated so databases from before this guard pick it up.
+        cursor.execute("DROP TRIGGER IF EXISTS mood_log_ai")
+        cursor.execute(f"""
+            CREATE TRIGGER mood_log_ai AFTER INSERT ON mood_log WHEN julianday(new.timestamp) IS NOT NULL BEGIN
+            {increments}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS mood_log_ad AFTER DELETE ON mood_log BEGIN
+            {decrements}
+            DELETE FROM mood_rollups WHERE count <= 0;
+            END
+        """)
+
+        if needs_backfill:
+            for bucket, expr in MOOD_BUCKETS.items():
+                cursor.execute(f"""
+                    INSERT INTO mood_rollups (bucket, period, mood, count)
+                    SELECT ?, {expr.format(ts='timestamp')} AS period, mood, COUNT(*)
+                    FROM mood_log WHERE julianday(timestamp) IS NOT NULL GROUP BY period, mood
+                """, (bucket,))
+
+def init_memory_search():
+    """Creates the FTS5 index over special_memories and keeps it in sync via triggers.
+
+    Existing databases created before the index get it populated from the current rows.
+    """
+    global FTS_ENABLED
+    try:
+        with transaction(MEMORY_DB) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'special_memories_fts'")
+            needs_rebuild = cursor.fetchone() is None
+
+            # External-content table: stores only the index, the text stays in special_memories
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS special_memories_fts USING fts5(
+                    memory,
+                    content='special_memories',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS special_memories_ai AFTER INSERT ON special_memories BEGIN
+                    INSERT INTO special_memories_fts(rowid, memory) VALUES (new.id, new.memory);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS special_memories_ad AFTER DELETE ON special_memories BEGIN
+                    INSERT INTO special_memories_fts(special_memories_fts, rowid, memory) VALUES ('delete', old.id, old.memory);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS special_memories_au AFTER UPDATE OF memory ON special_memories BEGIN
+                    INSERT INTO special_memories_fts(special_memories_fts, rowid, memory) VALUES ('delete', old.id, old.memory);
+                    INSERT INTO special_memories_fts(rowid, memory) VALUES (new.id, new.memory);
+                END
+            ''')
+
+            # Per-term document counts, used to drop near-universal query terms
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS special_memories_vocab USING fts5vocab(special_memories_fts, 'row')
+            ''')
 
-    conn.commit()
-    conn.close()
+            if needs_rebuild:
+                cursor.execute("INSERT INTO special_memories_fts(special_memories_fts) VALUES ('rebuild')")
+        FTS_ENABLED = True
+    except sqlite3.OperationalError as e:
+        logging.warning(f"FTS5 unavailable, falling back to keyword search: {e}")
+        FTS_ENABLED = False
+
+def import_legacy_mood_log(path=LEGACY_MOOD_LOG):
+    """One-time import of an existing mood_log.json into the mood_log table.
+
+    The file is renamed to <path>.imported afterwards so it is never imported twice.
+    """
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return 0
+    if not isinstance(entries, list):
+        return 0
+
+    rows = []
+    for entry in entries:
+        try:
+            timestamp = str(entry["timestamp"])
+            datetime.fromisoformat(timestamp)
+            rows.append((int(entry["mood"]), timestamp))
+        except (TypeError, KeyError, ValueError):
+            logging.warning(f"Skipping malformed mood entry: {entry}")
+    if not rows:
+        return 0
+
+    with transaction(MEMORY_DB) as conn:
+        conn.executemany("INSERT INTO mood_log (mood, timestamp) VALUES (?, ?)", rows)
+    os.replace(path, f"{path}.imported")
+    logging.info(f"Imported {len(rows)} mood entries from {path}")
+    return len(rows)
 
-# Call init_db() on module load
-init_db()
 
 # --- Summary Functions ---
 def get_today_summary(date: str):
     """Fetches the summary for a specific date."""
-    conn = sqlite3.connect(MEMORY_DB)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT summary, tips FROM daily_summaries WHERE date = ?", (date,))
+    conn = get_connection(MEMORY_DB)
+    cursor = conn.execute("SELECT summary, tips FROM daily_summaries WHERE date = ?", (date,))
     summary = cursor.fetchone()
-    conn.close()
     return dict(summary) if summary else None
 
-def upsert_today_summary(date: str, summary: str, tips: str):
-    """Inserts or updates the summary for a specific date."""
-    conn = sqlite3.connect(MEMORY_DB)
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO daily_summaries (date, summary, tips) VALUES (?, ?, ?) ON CONFLICT(date) DO UPDATE SET summary = excluded.summary, tips = excluded.tips",
-            (date, summary, tips)
+def get_summary_watermark(date: str) -> int:
+    """Highest buffer message id already folded into the summary for a date (0 if none)."""
+    conn = get_connection(MEMORY_DB)
+    row = conn.execute("SELECT last_message_id FROM daily_summaries WHERE date = ?", (date,)).fetchone()
+    return row[0] if row else 0
+
+def upsert_today_summary(date: str, summary: str, tips: str, last_message_id: int = 0):
+    """Inserts or updates the summary for a specific date.
+
+    last_message_id records the newest buffer message folded into it; it never moves backwards.
+    """
+    with transaction(MEMORY_DB) as conn:
+        conn.execute(
+            """INSERT INTO daily_summaries (date, summary, tips, last_message_id) VALUES (?, ?, ?, ?)
+               ON CONFLICT(date) DO UPDATE SET summary = excluded.summary, tips = excluded.tips,
+               last_message_id = MAX(last_message_id, excluded.last_message_id)""",
+            (date, summary, tips, last_message_id)
+        )
+
+def get_summaries(since: str = None, until: str = None, before: str = None, limit: int = 30):
+    """Fetches daily summaries newest first. since is inclusive, until exclusive (YYYY-MM-DD);
+    before continues a previous page from the last date it returned."""
+    clauses, params = [], []
+    if since:
+        clauses.append("date >= ?")
+        params.append(since)
+    if until:
+        clauses.append("date < ?")
+        params.append(until)
+    if before:
+        clauses.append("date < ?")
+        params.append(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    conn = get_connection(MEMORY_DB)
+    cursor = conn.execute(
+        f"SELECT date, summary, tips FROM daily_summaries {where} ORDER BY date DESC LIMIT ?",
+        params + [limit]
+    )
+    return [dict(row) for row in cursor.fetchall()]
+
+def get_summary_sources(start_date: str, end_date: str):
+    """Daily summaries in [start_date, end_date), oldest first, plus the (days, watermark) key identifying them."""
+    conn = get_connection(MEMORY_DB)
+    rows = conn.execute(
+        "SELECT date, summary, tips, last_message_id FROM daily_summaries WHERE date >= ? AND date < ? ORDER BY date",
+        (start_date, end_date)
+    ).fetchall()
+    key = (len(rows), max((row["last_message_id"] for row in rows), default=0))
+    return [dict(row) for row in rows], key
+
+def get_summary_rollup(period: str, start_date: str):
+    """Fetches a cached weekly or monthly summary, or None."""
+    conn = get_connection(MEMORY_DB)
+    row = conn.execute(
+        "SELECT period, start_date, summary, tips, source_days, source_watermark, created_at FROM summary_rollups WHERE period = ? AND start_date = ?",
+        (period, start_date)
+    ).fetchone()
+    return dict(row) if row else None
+
+def upsert_summary_rollup(period: str, start_date: str, summary: str, tips: str, source_key: tuple):
+    """Caches a weekly or monthly summary along with the key of the daily summaries it was built from."""
+    with transaction(MEMORY_DB) as conn:
+        conn.execute(
+            """INSERT OR REPLACE INTO summary_rollups
+               (period, start_date, summary, tips, source_days, source_watermark, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (period, start_date, summary, tips, source_key[0], source_key[1], datetime.now().isoformat())
         )
-        conn.commit()
-    finally:
-        conn.close()
+
+# --- Mood Functions ---
+def add_mood_entry(mood: int, timestamp: str = None):
+    """Appends one mood entry."""
+    timestamp = timestamp or datetime.now().isoformat()
+    with transaction(MEMORY_DB) as conn:
+        conn.execute("INSERT INTO mood_log (mood, timestamp) VALUES (?, ?)", (mood, timestamp))
+    return {"mood": mood, "timestamp": timestamp}
+
+def iter_mood_log(since: str = None, until: str = None, after: tuple = None, newest_first: bool = False,
+                  limit: int = None):
+    """Yields mood entries ordered by (timestamp, id) as they are read.
+
+    since is inclusive and until exclusive. after is the (timestamp, id) key of the last entry
+    already seen; reading resumes past it in the requested direction. Rows are fetched
+    MOOD_READ_BATCH at a time with a fresh keyset query, so no cursor stays open between batches.
+    Each entry is a dict with id, mood and timestamp.
+    """
+    direction, compare = ("DESC", "<") if newest_first else ("ASC", ">")
+    remaining = limit
+    while remaining is None or remaining > 0:
+        clauses, params = [], []
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if after:
+            clauses.append(f"(timestamp, id) {compare} (?, ?)")
+            params.extend(after)
+        batch_size = MOOD_READ_BATCH if remaining is None else min(MOOD_READ_BATCH, remaining)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        conn = get_connection(MEMORY_DB)
+        rows = conn.execute(
+            f"SELECT id, mood, timestamp FROM mood_log {where} "
+            f"ORDER BY timestamp {direction}, id {direction} LIMIT ?",
+            params + [batch_size]
+        ).fetchall()
+        for row in rows:
+            yield dict(row)
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1]["timestamp"], rows[-1]["id"])
+        if remaining is not None:
+            remaining -= len(rows)
+
+def clear_mood_log():
+    """Deletes all mood entries."""
+    with transaction(MEMORY_DB) as conn:
+        conn.execute("DELETE FROM mood_log")
+
+def get_mood_rollups(bucket: str, since: str = None, until: str = None):
+    """Fetches mood counts per period for one bucket size, oldest first.
+
+    since/until are timestamps or dates. since is inclusive and until exclusive, as in iter_mood_log:
+    the periods returned are those overlapping [since, until).
+    Returns [{"period": ..., "counts": {mood: count}}].
+    """
+    expr = MOOD_BUCKETS[bucket]
+    clauses, params = ["bucket = ?"], [bucket]
+    conn = get_connection(MEMORY_DB)
+    if since:
+        clauses.append(f"period >= {expr.format(ts='?')}")
+        params.append(since)
+    if until:
+        # The period containing until is only included when it starts before until
+        until_period, at_start = conn.execute(
+            f"SELECT {expr.format(ts='?')}, julianday(?) = julianday({MOOD_BUCKET_STARTS[bucket].format(ts='?')})",
+            (until, until, until)
+        ).fetchone()
+        clauses.append("period < ?" if at_start else "period <= ?")
+        params.append(until_period)
+
+    cursor = conn.execute(
+        f"SELECT period, mood, count FROM mood_rollups WHERE {' AND '.join(clauses)} ORDER BY period",
+        params
+    )
+    periods = {}
+    for row in cursor.fetchall():
+        periods.setdefault(row["period"], {})[row["mood"]] = row["count"]
+    return [{"period": period, "counts": counts} for period, counts in periods.items()]
 
 # --- Buffer Functions ---
 
-# Alternative version with message separation
-def add_to_buffer(sender: str, message: str):
-    """Accumulates messages in the buffer while maintaining conversation order."""
-    conn = sqlite3.connect(MEMORY_DB)
-    cursor = conn.cursor()
+def add_turn_to_buffer(user_message: str, assistant_message: str, session_id: str = DEFAULT_SESSION_ID):
+    """Inserts a user message and the assistant's reply as the session's next turn."""
     timestamp = datetime.now().isoformat()
-    
-    try:
-        # Check for existing unread message from this sender
-        cursor.execute(
-            "SELECT id, message FROM conversation_buffer WHERE sender = ? AND status = 'unread' ORDER BY timestamp DESC LIMIT 1",
-            (sender,)
+    with transaction(MEMORY_DB) as conn:
+        turn = _next_buffer_turn(conn, session_id)
+        conn.executemany(
+            "INSERT INTO conversation_buffer (timestamp, sender, message, status, session_id, turn) VALUES (?, ?, ?, 'unread', ?, ?)",
+            [(timestamp, "user", user_message, session_id, turn), (timestamp, "assistant", assistant_message, session_id, turn)]
+        )
+    return turn
+
+def _next_buffer_turn(conn, session_id: str) -> int:
+    # Turns already summarized or dropped from the chat window count too, in case compaction deleted their rows
+    row = conn.execute("""
+        SELECT MAX(
+            COALESCE((SELECT MAX(turn) FROM conversation_buffer WHERE session_id = ?), -1),
+            COALESCE((SELECT MAX(summary_turn, history_turn - 1) FROM chat_sessions WHERE session_id = ?), -1)
+        )
+    """, (session_id, session_id)).fetchone()
+    return row[0] + 1
+
+# --- Chat Session Functions ---
+def get_chat_session(session_id: str):
+    """Returns a chat session's settings and summary, or None if it was never used."""
+    row = get_connection(MEMORY_DB).execute(
+        "SELECT * FROM chat_sessions WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+def upsert_chat_session(session_id: str, user_name: str = None, language: str = None, context: str = None):
+    """Creates the session or updates the fields that are given (None keeps the stored value). Returns the session."""
+    now = datetime.now().isoformat()
+    with transaction(MEMORY_DB) as conn:
+        conn.execute(
+            """INSERT INTO chat_sessions (session_id, user_name, language, context, created_at, updated_at)
+               VALUES (?, COALESCE(?, ''), COALESCE(?, ''), COALESCE(?, ''), ?, ?)
+               ON CONFLICT(session_id) DO UPDATE SET
+                   user_name = COALESCE(?, user_name),
+                   language = COALESCE(?, language),
+                   context = COALESCE(?, context),
+                   updated_at = excluded.updated_at""",
+            (session_id, user_name, language, context, now, now, user_name, language, context)
+        )
+        row = conn.execute("SELECT * FROM chat_sessions WHERE session_id = ?", (session_id,)).fetchone()
+    return dict(row)
+
+def set_session_history_turn(session_id: str, turn: int):
+    """Stores the first turn the chat prompt still includes."""
+    with transaction(MEMORY_DB) as conn:
+        conn.execute("UPDATE chat_sessions SET history_turn = ? WHERE session_id = ?", (turn, session_id))
+
+def set_session_summary(session_id: str, summary: str, summary_turn: int):
+    """Stores the summary of the session's turns up to summary_turn; never replaces a summary of later turns."""
+    with transaction(MEMORY_DB) as conn:
+        conn.execute(
+            "UPDATE chat_sessions SET summary = ?, summary_turn = ? WHERE session_id = ? AND summary_turn < ?",
+            (summary, summary_turn, session_id, summary_turn)
         )
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Append to existing message with separator
-            updated_message = f"{existing[1]}\n---\n{message}"
-            cursor.execute(
-                "UPDATE conversation_buffer SET message = ?, timestamp = ? WHERE id = ?",
-                (updated_message, timestamp, existing[0])
-            )
-        else:
-            # Add new entry
-            cursor.execute(
-                """INSERT INTO conversation_buffer 
-                   (timestamp, sender, message, status) 
-                   VALUES (?, ?, ?, 'unread')""",
-                (timestamp, sender, message)
-            )
-        conn.commit()
-    finally:
-        conn.close()
+
+def get_session_history(session_id: str, after_turn: int = -1, max_turns: int = 50):
+    """Returns up to the last max_turns complete turns after after_turn as (turn, user message, assistant reply),
+    oldest first (all of them when max_turns is None). Reads only those rows, however long the session is."""
+    conn = get_connection(MEMORY_DB)
+    rows = conn.execute("""
+        SELECT turn, sender, message FROM conversation_buffer
+        WHERE session_id = ? AND turn > ?
+        ORDER BY turn DESC, id DESC
+        LIMIT ?
+    """, (session_id, after_turn, -1 if max_turns is None else max_turns * 2)).fetchall()
+    turns = {}
+    for row in rows:
+        turns.setdefault(row["turn"], {})[row["sender"]] = row["message"]
+    return [
+        (turn, messages["user"], messages["assistant"])
+        for turn, messages in sorted(turns.items())
+        if "user" in messages and "assistant" in messages
+    ]
+
+def list_chat_sessions(limit: int = 50):
+    """Most recently used chat sessions first, with their number of turns."""
+    conn = get_connection(MEMORY_DB)
+    rows = conn.execute("""
+        SELECT s.session_id, s.user_name, s.language, s.created_at, s.updated_at,
+               (SELECT MAX(turn) + 1 FROM conversation_buffer b WHERE b.session_id = s.session_id) AS turns
+        FROM chat_sessions s
+        ORDER BY s.updated_at DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+    return [{**dict(row), "turns": row["turns"] or 0} for row in rows]
 
 def get_unread_buffer():
-    """Fetches all unread messages grouped by sender."""
-    conn = sqlite3.connect(MEMORY_DB)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Group all messages by sender
-    cursor.execute("""
-        SELECT 
-            MIN(id) as id,
-            sender,
-            GROUP_CONCAT(message, '\n---\n') as message
-        FROM conversation_buffer 
+    """Fetches all unread messages, one per row, in conversation order (session, turn, user before assistant)."""
+    conn = get_connection(MEMORY_DB)
+    cursor = conn.execute("""
+        SELECT id, session_id, turn, sender, message, timestamp
+        FROM conversation_buffer
         WHERE status = 'unread'
-        GROUP BY sender
-        ORDER BY MIN(timestamp) ASC
+        ORDER BY session_id, turn, id
     """)
-    
-    messages = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return messages
-
-def delete_processed_buffer(ids):
-    """Marks all messages as processed."""
-    conn = sqlite3.connect(MEMORY_DB)
-    cursor = conn.cursor()
+    return [dict(row) for row in cursor.fetchall()]
+
+def claim_unread_buffer(limit: int = None):
+    """Snapshots the unread messages to process, oldest ids first.
+
+    Returns (watermark, rows): watermark is the highest claimed id, or None when nothing is
+    unread, and rows are in conversation order like get_unread_buffer(). Messages added later
+    get higher ids, so ack_buffer(watermark) never touches them.
+    """
+    conn = get_connection(MEMORY_DB)
+    query = "SELECT id FROM conversation_buffer WHERE status = 'unread' ORDER BY id DESC LIMIT 1"
+    params = ()
+    if limit:
+        query = """
+            SELECT MAX(id) FROM (
+                SELECT id FROM conversation_buffer WHERE status = 'unread' ORDER BY id LIMIT ?
+            )
+        """
+        params = (limit,)
+    row = conn.execute(query, params).fetchone()
+    watermark = row[0] if row else None
+    if watermark is None:
+        return None, []
+
+    cursor = conn.execute("""
+        SELECT id, session_id, turn, sender, message, timestamp
+        FROM conversation_buffer
+        WHERE status = 'unread' AND id <= ?
+        ORDER BY session_id, turn, id
+    """, (watermark,))
+    return watermark, [dict(row) for row in cursor.fetchall()]
+
+def ack_buffer(watermark: int):
+    """Marks the messages claimed up to watermark as processed. Returns how many were marked."""
+    with transaction(MEMORY_DB) as conn:
+        cursor = conn.execute(
+            "UPDATE conversation_buffer SET status = 'processed' WHERE status = 'unread' AND id <= ?",
+            (watermark,)
+        )
+        return cursor.rowcount
+
+def compact_buffer(keep_days: int = BUFFER_RETENTION_DAYS, keep_rows: int = BUFFER_RETENTION_ROWS,
+                   batch_size: int = COMPACTION_BATCH_SIZE, keep_unsummarized: bool = True):
+    """Deletes processed buffer rows past the retention policy, then returns freed pages to the OS.
+
+    A processed row is kept only if it is newer than keep_days and among the newest keep_rows
+    processed rows. Unread rows are never deleted. Returns the number of rows deleted and pages freed.
+
+    The buffer is also where chat sessions keep their history, so turns a session still needs are never
+    deleted, whatever the policy: those after its summary_turn while keep_unsummarized is set (they are
+    still to be folded into the session summary), otherwise those from its history_turn on.
+    """
+    conn = get_connection(MEMORY_DB)
+    cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat()
+    # Highest processed id that falls outside the newest keep_rows
+    row = conn.execute(
+        "SELECT id FROM conversation_buffer WHERE status = 'processed' ORDER BY id DESC LIMIT 1 OFFSET ?",
+        (keep_rows,)
+    ).fetchone()
+    max_id_by_rows = row[0] if row else 0
+
+    deleted = 0
+    while True:
+        with transaction(MEMORY_DB) as conn:
+            cursor = conn.execute("""
+                DELETE FROM conversation_buffer WHERE id IN (
+                    SELECT id FROM conversation_buffer
+                    WHERE status = 'processed' AND (id <= ? OR timestamp < ?)
+                    AND NOT EXISTS (
+                        SELECT 1 FROM chat_sessions s
+                        WHERE s.session_id = conversation_buffer.session_id AND conversation_buffer.turn > s.summary_turn
+                        AND (? OR conversation_buffer.turn >= s.history_turn)
+                    )
+                    LIMIT ?
+                )
+            """, (max_id_by_rows, cutoff, keep_unsummarized, batch_size))
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+
+    conn = get_connection(MEMORY_DB)
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if freelist:
+        # incremental_vacuum frees one page per step; executescript steps it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({freelist})")
+    return {"deleted_rows": deleted, "freed_pages": freelist}
+
+def get_storage_stats():
+    """Database file size, reclaimable pages and per-table row counts and sizes."""
+    conn = get_connection(MEMORY_DB)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE 'CREATE VIRTUAL%' ORDER BY name"
+    )]
+    table_stats = {table: {"rows": conn.execute(f"SELECT COUNT(*) FROM \"{table}\"").fetchone()[0]} for table in tables}
     try:
-        # Mark all as processed instead of deleting
-        cursor.execute("UPDATE conversation_buffer SET status = 'processed'")
-        conn.commit()
-    finally:
-        conn.close()
+        # dbstat is optional in SQLite builds; sizes include each table's indexes
+        for name, size in conn.execute("""
+            SELECT COALESCE(m.tbl_name, s.name), SUM(s.pgsize)
+            FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name
+            GROUP BY 1
+        """):
+            if name in table_stats:
+                table_stats[name]["bytes"] = size
+    except sqlite3.OperationalError:
+        pass
+
+    buffer_counts = dict(conn.execute("SELECT status, COUNT(*) FROM conversation_buffer GROUP BY status").fetchall())
+    return {
+        "file_bytes": page_size * page_count,
+        "page_size": page_size,
+        "page_count": page_count,
+        "reclaimable_pages": freelist,
+        "reclaimable_bytes": page_size * freelist,
+        "tables": table_stats,
+        "conversation_buffer": {
+            "unread": buffer_counts.get("unread", 0),
+            "processed": buffer_counts.get("processed", 0),
+        },
+    }
+
+# --- Analysis Cache Functions ---
+def get_cached_analysis(key: str, max_age_days: int = ANALYSIS_CACHE_TTL_DAYS):
+    """Returns the cached reply for key, or None when it is missing or older than max_age_days."""
+    now = datetime.now()
+    cutoff = (now - timedelta(days=max_age_days)).isoformat()
+    with transaction(MEMORY_DB) as conn:
+        row = conn.execute(
+            "SELECT result FROM analysis_cache WHERE key = ? AND created_at >= ?", (key, cutoff)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE analysis_cache SET last_used_at = ? WHERE key = ?", (now.isoformat(), key))
+    return row["result"]
+
+def put_cached_analysis(key: str, result: str):
+    """Stores or refreshes the reply for key."""
+    now = datetime.now().isoformat()
+    with transaction(MEMORY_DB) as conn:
+        conn.execute(
+            """INSERT INTO analysis_cache (key, result, created_at, last_used_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET result = excluded.result,
+                   created_at = excluded.created_at, last_used_at = excluded.last_used_at""",
+            (key, result, now, now)
+        )
+
+def evict_analysis_cache(max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES, max_age_days: int = ANALYSIS_CACHE_TTL_DAYS) -> int:
+    """Deletes expired entries, then the least recently used ones beyond max_entries. Returns the number deleted."""
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+    with transaction(MEMORY_DB) as conn:
+        deleted = conn.execute("DELETE FROM analysis_cache WHERE created_at < ?", (cutoff,)).rowcount
+        deleted += conn.execute(
+            """DELETE FROM analysis_cache WHERE key IN (
+                   SELECT key FROM analysis_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+               )""",
+            (max_entries,)
+        ).rowcount
+    return deleted
 
+def count_cached_analyses() -> int:
+    return get_connection(MEMORY_DB).execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+def clear_analysis_cache():
+    with transaction(MEMORY_DB) as conn:
+        conn.execute("DELETE FROM analysis_cache")
+
+def iter_table_batches(table: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yields (column_names, rows) batches of a whole table in id order.
+
+    Each batch is a fresh keyset query, so no cursor stays open while the caller is busy
+    and memory use does not depend on the table size.
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    last_id = None
+    while True:
+        conn = get_connection(MEMORY_DB)
+        if last_id is None:
+            cursor = conn.execute(f"SELECT * FROM {table} ORDER BY id LIMIT ?", (batch_size,))
+        else:
+            cursor = conn.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        if rows:
+            yield columns, [tuple(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]["id"]
 
 def load_memories_special(table="special_memories"):
     """Loads all memories from the specified table."""
-    conn = sqlite3.connect(MEMORY_DB)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT id, title, memory, timestamp FROM {table} ORDER BY timestamp DESC")
-    memories = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return memories
+    conn = get_connection(MEMORY_DB)
+    cursor = conn.execute(f"SELECT id, title, memory, timestamp FROM {table} ORDER BY timestamp DESC")
+    return [dict(row) for row in cursor.fetchall()]
 
 def get_relevant_special_memories(query, table="special_memories", k=20):
-    """Retrieves the most relevant special memories using keyword matching from the specified table."""
+    """Retrieves the most relevant special memories from the specified table, ranked by BM25."""
     if not query:
         return []
 
-    conn = sqlite3.connect(MEMORY_DB)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    if not FTS_ENABLED or table != "special_memories":
+        return _keyword_search_special_memories(query, table, k)
+
+    terms = list(dict.fromkeys(re.findall(r"\w+", query.lower())))
+    if not terms:
+        return []
+
+    conn = get_connection(MEMORY_DB)
+
+    # Terms found in most memories ("the", "my", ...) barely affect BM25 ranking but make
+    # the OR query visit nearly every row, so drop them while any rarer term remains.
+    placeholders = ", ".join("?" for _ in terms)
+    doc_counts = dict(conn.execute(
+        f"SELECT term, doc FROM special_memories_vocab WHERE term IN ({placeholders})", terms
+    ).fetchall())
+    # MAX(rowid) is an O(log n) upper bound on the row count, close enough for this cut-off
+    total = conn.execute("SELECT MAX(rowid) FROM special_memories").fetchone()[0] or 0
+    cutoff = max(total * COMMON_TERM_RATIO, COMMON_TERM_MIN_DOCS)
+    rare_terms = [term for term in terms if doc_counts.get(term, 0) <= cutoff]
+    terms = rare_terms or terms
+
+    # Quote every term so user text can never be parsed as FTS5 query syntax
+    match_query = " OR ".join(f'"{term}"' for term in terms)
+
+    cursor = conn.execute("""
+        SELECT m.memory, m.timestamp
+        FROM special_memories_fts
+        JOIN special_memories AS m ON m.id = special_memories_fts.rowid
+        WHERE special_memories_fts MATCH ?
+        ORDER BY bm25(special_memories_fts)
+        LIMIT ?
+    """, (match_query, k))
+    return [dict(row) for row in cursor.fetchall()]
+
+def _keyword_search_special_memories(query, table, k):
+    """Keyword LIKE matching scored by word overlap, used when FTS5 is unavailable."""
+    conn = get_connection(MEMORY_DB)
 
     query_words = query.lower().split()
     search_clauses = [f"memory LIKE ?" for _ in query_words]
     sql_query = f"SELECT memory, timestamp FROM {table} WHERE {' OR '.join(search_clauses)}"
     like_params = [f"%{word}%" for word in query_words]
 
-    cursor.execute(sql_query, like_params)
-    results = cursor.fetchall()
-    conn.close()
+    results = conn.execute(sql_query, like_params).fetchall()
 
     if not results:
         return []
@@ -185,52 +852,52 @@ def get_relevant_special_memories(query, table="special_memories", k=20):
     return [item["memory"] for item in scored_memories[:k]]
 
 
+def get_special_memories_by_ids(memory_ids):
+    """Fetches special memories by ID, preserving the order of memory_ids."""
+    if not memory_ids:
+        return []
+    conn = get_connection(MEMORY_DB)
+    placeholders = ", ".join("?" for _ in memory_ids)
+    cursor = conn.execute(f"SELECT id, memory, timestamp FROM special_memories WHERE id IN ({placeholders})", list(memory_ids))
+    rows = {row["id"]: row for row in cursor.fetchall()}
+    return [{"memory": rows[i]["memory"], "timestamp": rows[i]["timestamp"]} for i in memory_ids if i in rows]
+
+
 def add_special_memory(memory_text, title, table="special_memories"):
-    """Adds a new, unique memory to the specified table."""
-    conn = sqlite3.connect(MEMORY_DB)
-    cursor = conn.cursor()
+    """Adds a new, unique memory to the specified table.
+
+    Returns the new memory's id, or None if an identical memory already exists.
+    """
     timestamp = datetime.now().isoformat()
-    was_added = False
+    memory_id = None
     try:
-        cursor.execute(f"INSERT OR IGNORE INTO {table} (title, memory, timestamp) VALUES (?, ?, ?)", (title, memory_text, timestamp))
-        conn.commit()
-        was_added = cursor.rowcount > 0
+        with transaction(MEMORY_DB) as conn:
+            cursor = conn.execute(f"INSERT OR IGNORE INTO {table} (title, memory, timestamp) VALUES (?, ?, ?)", (title, memory_text, timestamp))
+            if cursor.rowcount > 0:
+                memory_id = cursor.lastrowid
     except sqlite3.IntegrityError:
-        was_added = False
-    finally:
-        conn.close()
-    return was_added
-        
+        memory_id = None
+    return memory_id
+
 
 def clear_memories(table):
     """Clears all memories from the specified table."""
-    conn = sqlite3.connect(MEMORY_DB)
-    cursor = conn.cursor()
-    cursor.execute(f"DELETE FROM {table}")
-    conn.commit()
-    conn.close()
-    
-    
+    with transaction(MEMORY_DB) as conn:
+        conn.execute(f"DELETE FROM {table}")
+
+
 def delete_special_memory(memory_id: int, table="special_memories"):
     """Deletes a specific memory from the specified table by its ID."""
-    conn = sqlite3.connect(MEMORY_DB)
-    cursor = conn.cursor()
-    cursor.execute(f"DELETE FROM {table} WHERE id = ?", (memory_id,))
-    conn.commit()
-    conn.close()
+    with transaction(MEMORY_DB) as conn:
+        conn.execute(f"DELETE FROM {table} WHERE id = ?", (memory_id,))
 
 
 def update_special_memory(memory_id: int, new_title: str, new_memory_text: str):
     """Updates a specific special memory."""
-    conn = sqlite3.connect(MEMORY_DB)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("UPDATE special_memories SET title = ?, memory = ? WHERE id = ?", (new_title, new_memory_text, memory_id))
-        conn.commit()
-    finally:
-        conn.close()
-        
+    with transaction(MEMORY_DB) as conn:
+        conn.execute("UPDATE special_memories SET title = ?, memory = ? WHERE id = ?", (new_title, new_memory_text, memory_id))
+
 
 def clear_all_memories():
     """Clears all memories from all tables."""
-    clear_memories("special_memories")
\ No newline at end of file
+    clear_memories("special_memories")
@@ -0,0 +1,65 @@
+import logging
+
+# --- Configuration ---
+EMBEDDING_MODEL = "nomic-embed-text"
+INDEX_PATH = "memory_vectors"  # <INDEX_PATH>.f32 / .ids / .json next to memory.db
+
+_embedders = {}
+
+
+def get_embedder(model_name: str = EMBEDDING_MODEL):
+    """Get or create a cached Ollama embedding client."""
+    if model_name not in _embedders:
+        from langchain_ollama import OllamaEmbeddings  # Slow to import, only needed once semantic memory is used
+        _embedders[model_name] = OllamaEmbeddings(model=model_name)
+    return _embedders[model_name]
+
+
+_index = None
+
+
+def get_index(model_name: str = EMBEDDING_MODEL):
+    """Returns the process-wide vector index, reopening it if the embedding model changed."""
+    global _index
+    if _index is None or _index.model_name != model_name:
+        from vector_index import VectorIndex  # numpy is only loaded once the index is used
+        _index = VectorIndex(INDEX_PATH, model_name)
+    return _index
+
+
+async def index_memories(memories, model_name: str = EMBEDDING_MODEL):
+    """Embeds and stores (memory_id, text) pairs, replacing any previous vectors for those ids."""
+    memories = list(memories)
+    if not memories:
+        return
+    vectors = await get_embedder(model_name).aembed_documents([text for _, text in memories])
+    get_index(model_name).upsert([memory_id for memory_id, _ in memories], vectors)
+
+
+def remove_memories(memory_ids, model_name: str = EMBEDDING_MODEL):
+    get_index(model_name).remove(memory_ids)
+
+
+async def search_memories(query: str, k: int = 5, model_name: str = EMBEDDING_MODEL):
+    """Returns [(memory_id, similarity)] for the memories closest in meaning to query."""
+    index = get_index(model_name)
+    if not len(index):
+        return []
+    query_vector = await get_embedder(model_name).aembed_query(query)
+    return index.search(query_vector, k)
+
+
+async def sync_index(memories, model_name: str = EMBEDDING_MODEL, batch_size: int = 64):
+    """Brings the index in line with the given (memory_id, text) rows: embeds missing ones, drops stale ids."""
+    index = get_index(model_name)
+    memories = list(memories)
+    current_ids = {memory_id for memory_id, _ in memories}
+    stale = index.ids() - current_ids
+    if stale:
+        index.remove(stale)
+
+    missing = [(memory_id, text) for memory_id, text in memories if memory_id not in index]
+    for start in range(0, len(missing), batch_size):
+        await index_memories(missing[start:start + batch_size], model_name)
+    if missing:
+        logging.info(f"Embedded {len(missing)} special memories into the vector index")
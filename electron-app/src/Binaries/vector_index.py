@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+# --- Configuration ---
+MIN_SIMILARITY = 0.35  # Cosine similarity below this is treated as unrelated
+COMPACT_RATIO = 0.5    # Rewrite the index once this fraction of rows is dead
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class VectorIndex:
+    """Append-only, memory-mapped float32 index of unit-length memory embeddings.
+
+    Rows live in a raw float32 file (one row per embedded memory) with a parallel int64 file of
+    memory ids. Appends write to the end of both files; removals overwrite the id with -1 and the
+    files are compacted once enough rows are dead, so no write rewrites the whole index.
+    """
+
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.model_name = model_name
+        self.dim = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows = {}        # memory id -> row position
+        self._vectors = None   # np.memmap, reopened lazily after appends
+        self._load()
+
+    # --- Files ---
+    @property
+    def _vectors_file(self):
+        return f"{self.path}.f32"
+
+    @property
+    def _ids_file(self):
+        return f"{self.path}.ids"
+
+    @property
+    def _meta_file(self):
+        return f"{self.path}.json"
+
+    def _load(self):
+        try:
+            with open(self._meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if meta.get("model") != self.model_name:
+            # Vectors from another model are not comparable, start over
+            logging.info(f"Embedding model changed to {self.model_name}, resetting vector index")
+            self.clear()
+            return
+
+        self.dim = meta["dim"]
+        ids = np.fromfile(self._ids_file, dtype=np.int64) if os.path.exists(self._ids_file) else np.empty(0, dtype=np.int64)
+        vector_rows = os.path.getsize(self._vectors_file) // (4 * self.dim) if os.path.exists(self._vectors_file) else 0
+        # Trim any partially written tail left by an interrupted append
+        self._ids = ids[:min(len(ids), vector_rows)].copy()
+        self._rows = {int(memory_id): row for row, memory_id in enumerate(self._ids) if memory_id >= 0}
+
+    def _write_meta(self):
+        with open(self._meta_file, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": self.dim}, f)
+
+    def _matrix(self):
+        if self._vectors is None or self._vectors.shape[0] != len(self._ids):
+            self._vectors = None
+            if len(self._ids) == 0:
+                return None
+            self._vectors = np.memmap(self._vectors_file, dtype=np.float32, mode="r", shape=(len(self._ids), self.dim))
+        return self._vectors
+
+    def _live_vectors(self, live):
+        """In-memory copy of the rows selected by live; no reference to the mapping outlives the call."""
+        matrix = self._matrix()
+        if matrix is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.array(matrix[live])
+
+    # --- Mutations ---
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, memory_id):
+        return int(memory_id) in self._rows
+
+    def ids(self):
+        return set(self._rows)
+
+    def upsert(self, memory_ids, vectors):
+        """Adds or replaces the embeddings for the given memory ids."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(memory_ids), -1))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._write_meta()
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+        self.remove(memory_ids)
+        start = len(self._ids)
+        with open(self._vectors_file, "ab") as f:
+            f.write(vectors.tobytes())
+        new_ids = np.asarray(memory_ids, dtype=np.int64)
+        with open(self._ids_file, "ab") as f:
+            f.write(new_ids.tobytes())
+
+        self._ids = np.concatenate([self._ids, new_ids])
+        for offset, memory_id in enumerate(new_ids):
+            self._rows[int(memory_id)] = start + offset
+
+    def remove(self, memory_ids):
+        """Marks the rows of the given memory ids as dead."""
+        rows = [self._rows.pop(int(memory_id)) for memory_id in memory_ids if int(memory_id) in self._rows]
+        if not rows:
+            return
+        with open(self._ids_file, "r+b") as f:
+            for row in rows:
+                self._ids[row] = -1
+                f.seek(row * 8)
+                f.write(np.int64(-1).tobytes())
+
+        if len(self._ids) - len(self._rows) > len(self._ids) * COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Rewrites the index files without dead rows."""
+        live = self._ids >= 0
+        vectors = self._live_vectors(live)
+        ids = self._ids[live]
+        self._vectors = None  # drop the last reference to the mapping so the file can be replaced (Windows)
+
+        for target, data in ((self._vectors_file, vectors), (self._ids_file, ids)):
+            with open(f"{target}.tmp", "wb") as f:
+                f.write(data.tobytes())
+            os.replace(f"{target}.tmp", target)
+
+        self._ids = ids.copy()
+        self._rows = {int(memory_id): row for row, memory_id in enumerate(self._ids)}
+
+    def clear(self):
+        """Deletes the index files and empties the index."""
+        self._vectors = None
+        for path in (self._vectors_file, self._ids_file, self._meta_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dim = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows = {}
+
+    # --- Search ---
+    def search(self, query_vector, k: int = 5, min_similarity: float = MIN_SIMILARITY):
+        """Returns [(memory_id, similarity)] for the k most similar memories, best first."""
+        matrix = self._matrix()
+        if matrix is None or not self._rows:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        if query.shape[0] != self.dim:
+            return []
+
+        scores = matrix @ query
+        scores[self._ids < 0] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self._ids[row]), float(scores[row])) for row in top if scores[row] >= min_similarity]